@@ -0,0 +1,280 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import fnmatch
+import json
+import operator
+import queue
+import threading
+import time
+from collections import deque
+
+import click
+from hist import snapshot_samples
+
+ALERT_COMPARATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+# Metric names follow the history series, patterns match one alert per series
+DEFAULT_RULES = [
+    {"name": "hot-sensor", "metric": "senstemp.*", "comparator": ">", "threshold": 75.0, "window": 30, "clear": 70.0},
+    {"name": "disk-full", "metric": "diskused.*.percent", "comparator": ">", "threshold": 90.0, "clear": 85.0},
+    {"name": "memory-pressure", "metric": "virtdata.percent", "comparator": ">", "threshold": 90.0, "window": 60,
+     "clear": 85.0},
+    {"name": "swap-thrash", "metric": "swapinfo.sout_rate", "comparator": ">", "threshold": 1048576.0, "window": 60,
+     "aggregate": "mean", "clear": 262144.0},
+]
+
+# Seconds a series may be missing before its windows are dropped, rules with longer windows wait a full window
+SERIES_EXPIRY = 60.0
+
+
+def read_rules_file(rulepath):
+    with open(rulepath, "r", encoding="utf-8") as fileobjc:
+        rulelist = json.load(fileobjc)
+    if not isinstance(rulelist, list):
+        raise ValueError("The rules file must hold a list of rules")
+    return rulelist
+
+
+class SlidingWindow:
+    def __init__(self, duration):
+        self.duration = duration
+        self.samples = deque()
+        self.totlsumm = 0.0
+        # Monotonic deques keep the window extremes at their heads, each sample is pushed and popped once
+        self.minqueue = deque()
+        self.maxqueue = deque()
+        self.firstime = None
+        self.lastseen = None
+
+    def push(self, timestmp, value):
+        if self.firstime is None:
+            self.firstime = timestmp
+        self.lastseen = timestmp
+        self.samples.append((timestmp, value))
+        self.totlsumm += value
+        while self.minqueue and self.minqueue[-1][1] >= value:
+            self.minqueue.pop()
+        self.minqueue.append((timestmp, value))
+        while self.maxqueue and self.maxqueue[-1][1] <= value:
+            self.maxqueue.pop()
+        self.maxqueue.append((timestmp, value))
+        cutoff = timestmp - self.duration
+        while self.samples[0][0] < cutoff:
+            self.totlsumm -= self.samples.popleft()[1]
+        while self.minqueue[0][0] < cutoff:
+            self.minqueue.popleft()
+        while self.maxqueue[0][0] < cutoff:
+            self.maxqueue.popleft()
+
+    def covered(self, timestmp):
+        return timestmp - self.firstime >= self.duration
+
+    def aggregate(self, function):
+        if function == "min":
+            return self.minqueue[0][1]
+        if function == "max":
+            return self.maxqueue[0][1]
+        return self.totlsumm / len(self.samples)
+
+
+class AlertRule:
+    def __init__(self, name, metric, comparator, threshold, window=0, clear=None, aggregate=None):
+        if comparator not in ALERT_COMPARATORS:
+            raise ValueError("Unknown comparator %r in rule %s" % (comparator, name))
+        if aggregate not in (None, "mean", "min", "max"):
+            raise ValueError("Unknown aggregate %r in rule %s" % (aggregate, name))
+        self.name = name
+        self.metric = metric
+        self.comparator = comparator
+        self.compfunc = ALERT_COMPARATORS[comparator]
+        self.threshold = float(threshold)
+        self.window = float(window)
+        # Hysteresis, a firing alert resolves only once the value is back past the clear level
+        self.clear = float(clear) if clear is not None else self.threshold
+        # By default the condition has to hold across the whole window, so its weakest sample decides
+        self.aggregate = aggregate or ("min" if comparator.startswith(">") else "max")
+
+    def return_rule(self):
+        retndata = {
+            "name": self.name,
+            "metric": self.metric,
+            "comparator": self.comparator,
+            "threshold": self.threshold,
+            "window": self.window,
+            "clear": self.clear,
+            "aggregate": self.aggregate,
+        }
+        return retndata
+
+
+class LogSink:
+    def __init__(self, logpath=None):
+        self.logpath = logpath
+
+    def __call__(self, event):
+        textline = "%s alert %s %s on %s, value %s against %s" % (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event["timestmp"])), event["rule"],
+            event["state"], event["metric"], event["value"], event["threshold"],
+        )
+        if self.logpath is None:
+            click.echo(" * " + click.style("Alert", fg="red" if event["state"] == "firing" else "green") + ": " +
+                       textline)
+        else:
+            with open(self.logpath, "a", encoding="utf-8") as fileobjc:
+                fileobjc.write(textline + "\n")
+
+
+class WebhookSink:
+    def __init__(self, hookurl, timeout=5.0, maxqueue=256):
+        import urllib.parse
+        urlparts = urllib.parse.urlsplit(hookurl)
+        # Checked up front, a bad URL would otherwise only surface on the first alert
+        if urlparts.scheme not in ("http", "https") or not urlparts.netloc:
+            raise ValueError("The webhook URL must be an absolute http or https URL: %s" % hookurl)
+        self.hookurl = hookurl
+        self.timeout = timeout
+        # Posting happens on its own thread so a slow receiver never stalls the sampling loop
+        self.pending = queue.Queue(maxqueue)
+        self.thrdobjc = threading.Thread(target=self.posting_loop, name="alertwebhook", daemon=True)
+        self.thrdobjc.start()
+
+    def posting_loop(self):
+        import http.client
+        import urllib.request
+        while True:
+            event = self.pending.get()
+            try:
+                rqstobjc = urllib.request.Request(self.hookurl, data=json.dumps(event).encode("utf-8"),
+                                                  headers={"Content-Type": "application/json"}, method="POST")
+                with urllib.request.urlopen(rqstobjc, timeout=self.timeout) as respobjc:
+                    respobjc.read()
+            except (OSError, ValueError, http.client.HTTPException):
+                # A failed delivery is dropped, the thread has to outlive it for the next alert
+                pass
+
+    def __call__(self, event):
+        try:
+            self.pending.put_nowait(event)
+        except queue.Full:
+            pass
+
+
+class AlertEngine:
+    def __init__(self, rules=None, sinks=None, recent=100):
+        self.rules = [AlertRule(**indx) for indx in (DEFAULT_RULES if rules is None else rules)]
+        self.sinks = list(sinks or [])
+        self.matching = {}
+        self.windows = {}
+        self.active = {}
+        self.recent = deque(maxlen=recent)
+        self.lastswep = None
+        self.lockobjc = threading.Lock()
+
+    def match_rules(self, metrname):
+        rulelist = self.matching.get(metrname)
+        if rulelist is None:
+            # Patterns are matched once per series name, later samples only do a dict lookup
+            rulelist = [indx for indx in self.rules if fnmatch.fnmatchcase(metrname, indx.metric)]
+            self.matching[metrname] = rulelist
+        return rulelist
+
+    def build_event(self, rule, metrname, state, aggrvalu, timestmp):
+        event = {
+            "rule": rule.name,
+            "metric": metrname,
+            "state": state,
+            "value": round(aggrvalu, 3),
+            "threshold": rule.threshold if state == "firing" else rule.clear,
+            "timestmp": timestmp,
+        }
+        return event
+
+    def expire_series(self, timestmp, samples):
+        events = []
+        rulemaps = {indx.name: indx for indx in self.rules}
+        # Interfaces and cgroups come and go, windows of series gone for a full window are dropped
+        for alrtkeys, window in list(self.windows.items()):
+            if timestmp - window.lastseen < max(window.duration, SERIES_EXPIRY):
+                continue
+            del self.windows[alrtkeys]
+            if alrtkeys in self.active:
+                # The series will never report a recovery, so its alert is resolved on the way out
+                event = self.build_event(rulemaps[alrtkeys[0]], alrtkeys[1], "resolved",
+                                         window.aggregate(rulemaps[alrtkeys[0]].aggregate), timestmp)
+                event["expired"] = True
+                events.append(event)
+        self.matching = {indx: rulelist for indx, rulelist in self.matching.items() if indx in samples}
+        return events
+
+    def evaluate(self, timestmp, samples):
+        events = []
+        for metrname, value in samples.items():
+            for rule in self.match_rules(metrname):
+                alrtkeys = (rule.name, metrname)
+                window = self.windows.get(alrtkeys)
+                if window is None:
+                    window = self.windows[alrtkeys] = SlidingWindow(rule.window)
+                window.push(timestmp, value)
+                if not window.covered(timestmp):
+                    continue
+                aggrvalu = window.aggregate(rule.aggregate)
+                firing = alrtkeys in self.active
+                if not firing and rule.compfunc(aggrvalu, rule.threshold):
+                    state = "firing"
+                elif firing and not rule.compfunc(aggrvalu, rule.clear):
+                    state = "resolved"
+                else:
+                    continue
+                events.append(self.build_event(rule, metrname, state, aggrvalu, timestmp))
+        if self.lastswep is None or timestmp - self.lastswep >= SERIES_EXPIRY / 4:
+            self.lastswep = timestmp
+            events.extend(self.expire_series(timestmp, samples))
+        if events:
+            with self.lockobjc:
+                for event in events:
+                    alrtkeys = (event["rule"], event["metric"])
+                    if event["state"] == "firing":
+                        self.active[alrtkeys] = event
+                    else:
+                        event["since"] = self.active.pop(alrtkeys)["timestmp"]
+                    self.recent.append(event)
+            for event in events:
+                for sink in self.sinks:
+                    sink(event)
+        return events
+
+    def __call__(self, snapshot):
+        self.evaluate(snapshot.timestmp, snapshot_samples(snapshot))
+
+    def return_alert_data(self):
+        with self.lockobjc:
+            retndata = {
+                "active": list(self.active.values()),
+                "recent": list(self.recent),
+                "rules": [indx.return_rule() for indx in self.rules],
+            }
+        return retndata
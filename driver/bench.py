@@ -0,0 +1,320 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import encd
+import falcon
+import falcon.testing
+from falc import DeadUpdatingEndpoint, LiveUpdatingEndpoint
+from hard import DeadUpdatingElements, LiveSampler, ProcessHandler, SensorCollector, return_process_table
+from synt import SyntheticHost
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def measure_callable(callobjc, rounds):
+    timings = []
+    for indx in range(rounds):
+        strttime = time.perf_counter()
+        callobjc()
+        timings.append((time.perf_counter() - strttime) * 1000)
+    retndata = {
+        "rounds": rounds,
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+    return retndata
+
+
+@click.group()
+def benchfunc():
+    pass
+
+
+@benchfunc.command("procscan")
+@click.option("-n", "--rounds", "rounds", help="Set the number of timed rounds.", default=20)
+def procscan(rounds):
+    retndata = {}
+    listings = {}
+    for procback in ("psutil", "procfs"):
+        proctabl = return_process_table(procback)
+        listings[procback] = proctabl.return_listing()
+        retndata[procback + "_listing"] = measure_callable(proctabl.return_listing, rounds)
+        prociden = min(listings[procback])
+        retndata[procback + "_procinfo"] = measure_callable(
+            ProcessHandler(prociden, procback).return_process_info, rounds
+        )
+    mismatch = []
+    for prociden, singlist in listings["psutil"].items():
+        othrlist = listings["procfs"].get(prociden)
+        # The benchmark itself allocates between the two scans
+        if othrlist is None or prociden == os.getpid():
+            continue
+        for indx in ("name", "username", "memory_percent"):
+            if singlist[indx] != othrlist[indx]:
+                mismatch.append({"pid": prociden, "field": indx})
+    retndata["processes"] = len(listings["psutil"])
+    retndata["mismatch"] = mismatch
+    click.echo(json.dumps({"procscan": retndata}, ensure_ascii=False))
+
+
+@benchfunc.command("encoding")
+@click.option("-n", "--rounds", "rounds", help="Set the number of timed rounds.", default=20)
+def encoding(rounds):
+    retnjson = DeadUpdatingElements().return_dead_data()
+    bodydata = json.dumps(retnjson, ensure_ascii=False).encode("utf-8")
+    retndata = {
+        "identity_bytes": len(bodydata),
+        "stdlib_json": measure_callable(lambda: json.dumps(retnjson, ensure_ascii=False).encode("utf-8"), rounds),
+        "backend_json": dict(measure_callable(lambda: encd.encode_json(retnjson), rounds),
+                             backend=encd.json_backend_name()),
+    }
+    respenco = encd.ResponseEncoder()
+    for contenco in respenco.encoders:
+        retndata[contenco] = dict(measure_callable(lambda: respenco.compress(bodydata, contenco), rounds),
+                                  bytes=len(respenco.compress(bodydata, contenco)))
+    # Shared snapshots pay for serialization and compression once, later clients only hit the cache
+    snapcach = encd.EncodedSnapshotCache(respenco)
+    snapcach.fetch(1, "full", "gzip", lambda: retnjson)
+    retndata["cached_gzip"] = measure_callable(lambda: snapcach.fetch(1, "full", "gzip", lambda: retnjson), rounds)
+    click.echo(json.dumps({"encoding": retndata}, ensure_ascii=False))
+
+
+@benchfunc.command("loadtest")
+@click.option("-u", "--url", "baseurl", help="Set the driver base URL.", default="http://127.0.0.1:4040")
+@click.option("-c", "--passcode", "passcode", help="Set the driver passcode.", required=True)
+@click.option("-e", "--endpoint", "endpoint", help="Set the endpoint to load.", default="/livesync")
+@click.option("-l", "--clients", "clients", help="Set the concurrency levels to step through.", default="1,4,16,64")
+@click.option("-n", "--requests", "requests", help="Set the number of requests per level.", default=400)
+def loadtest(baseurl, passcode, endpoint, clients, requests):
+    urlpath = baseurl.rstrip("/") + endpoint + ("&" if "?" in endpoint else "?") + "passcode=" + passcode
+
+    def timed_request(indx):
+        strttime = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urlpath, timeout=30) as respobjc:
+                respobjc.read()
+            failed = False
+        except OSError:
+            failed = True
+        return (time.perf_counter() - strttime) * 1000, failed
+
+    for clntqant in [int(indx) for indx in clients.split(",")]:
+        with ThreadPoolExecutor(max_workers=clntqant) as executor:
+            strttime = time.perf_counter()
+            results = list(executor.map(timed_request, range(requests)))
+            duration = time.perf_counter() - strttime
+        timings = [indx[0] for indx in results]
+        retndata = {
+            "endpoint": endpoint,
+            "clients": clntqant,
+            "requests": requests,
+            "errors": sum(1 for indx in results if indx[1]),
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "throughput_rps": round(requests / duration, 1),
+        }
+        click.echo(json.dumps({"loadtest": retndata}, ensure_ascii=False))
+
+
+def spawn_activated_driver(passcode, sockobjc):
+    def hand_over_socket():
+        # Runs in the child between fork and exec, the way systemd hands over a listening socket
+        os.dup2(sockobjc.fileno(), 3)
+        os.environ["LISTEN_FDS"] = "1"
+        os.environ["LISTEN_PID"] = str(os.getpid())
+
+    drivpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "falc.py")
+    return subprocess.Popen([sys.executable, drivpath, "-c", passcode], preexec_fn=hand_over_socket, pass_fds=(3,),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def valid_live_data(retnjson):
+    # The first published snapshot must already carry real percentages, not the unprimed zeros
+    cpuprcnt = retnjson.get("cpuprcnt") or {}
+    return bool(cpuprcnt) and any(value > 0 for value in cpuprcnt.values()) and "virtdata" in retnjson
+
+
+@benchfunc.command("startup")
+@click.option("-n", "--rounds", "rounds", help="Set the number of timed rounds.", default=5)
+@click.option("-x", "--maxms", "maxms", help="Fail when time to first valid /livesync exceeds this.", default=None,
+              type=float)
+def startup(rounds, maxms):
+    drivdire = os.path.dirname(os.path.abspath(__file__))
+    imprtime = []
+    for indx in range(rounds):
+        strttime = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import falc"], cwd=drivdire, check=True)
+        imprtime.append((time.perf_counter() - strttime) * 1000)
+    frsttime, validtim = [], []
+    for indx in range(rounds):
+        sockobjc = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sockobjc.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sockobjc.bind(("127.0.0.1", 0))
+        sockobjc.listen(16)
+        urlpath = "http://127.0.0.1:%d/livesync?passcode=startup" % sockobjc.getsockname()[1]
+        strttime = time.perf_counter()
+        procobjc = spawn_activated_driver("startup", sockobjc)
+        try:
+            firstmsec = None
+            # The socket is listening before the driver runs, so requests queue instead of being refused
+            while time.perf_counter() - strttime < 30:
+                with urllib.request.urlopen(urlpath, timeout=30) as respobjc:
+                    retnjson = json.loads(respobjc.read())
+                elapsed = (time.perf_counter() - strttime) * 1000
+                if firstmsec is None:
+                    firstmsec = elapsed
+                if valid_live_data(retnjson):
+                    validtim.append(elapsed)
+                    break
+                time.sleep(0.01)
+            frsttime.append(firstmsec)
+        finally:
+            procobjc.terminate()
+            procobjc.wait()
+            sockobjc.close()
+    retndata = {
+        "rounds": rounds,
+        "import_p50_ms": round(statistics.median(imprtime), 3),
+        "first_response_p50_ms": round(statistics.median(frsttime), 3),
+        "first_valid_p50_ms": round(statistics.median(validtim), 3) if validtim else None,
+        "first_valid_max_ms": round(max(validtim), 3) if validtim else None,
+        "maxms": maxms,
+    }
+    click.echo(json.dumps({"startup": retndata}, ensure_ascii=False))
+    if maxms is not None and (len(validtim) < rounds or max(validtim) > maxms):
+        raise SystemExit(1)
+
+
+def measure_allocation(callobjc):
+    # Peak is the transient working set of one call, retained is what survives it
+    tracemalloc.start()
+    try:
+        strtsize = tracemalloc.get_traced_memory()[0]
+        callobjc()
+        currsize, peaksize = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peaksize - strtsize, "retained_bytes": currsize - strtsize}
+
+
+def measure_requests(clntobjc, urlpath, rounds, headers=None, beforefunc=None):
+    timings = []
+    for indx in range(rounds):
+        if beforefunc is not None:
+            beforefunc()
+        strttime = time.perf_counter()
+        respobjc = clntobjc.simulate_get(urlpath, params={"passcode": "synthetic"}, headers=headers)
+        timings.append((time.perf_counter() - strttime) * 1000)
+    retndata = {
+        "rounds": rounds,
+        "p50_ms": round(percentile(timings, 0.50), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "throughput_rps": round(rounds / (sum(timings) / 1000), 1),
+        "bytes": len(respobjc.content),
+    }
+    return retndata
+
+
+def synthetic_round(host, procback, rounds):
+    retndata = {"processes": host.procs, "backend": procback, "collectors": {}, "deadcollectors": {}}
+    sampler = LiveSampler(procback=procback)
+    elements = sampler.elements
+    elements.sensors = SensorCollector(sysfpath=host.sysfpath)
+    elements.prime_baselines()
+    host.advance()
+    collects = dict(elements.return_live_collectors(), **elements.return_optional_collectors())
+    for sectname, collfunc in collects.items():
+        retndata["collectors"][sectname] = dict(measure_callable(collfunc, rounds), **measure_allocation(collfunc))
+    deadelem = DeadUpdatingElements(procback)
+    for factname, collfunc in (("osnmdata", deadelem.get_os_uname_data),
+                               ("cpuquant", deadelem.get_cpu_logical_count),
+                               ("diskpart", deadelem.get_all_disk_partitions),
+                               ("netstats", deadelem.get_network_statistics),
+                               ("netaddrs", deadelem.get_network_if_addresses),
+                               ("boottime", deadelem.get_boot_time)):
+        retndata["deadcollectors"][factname] = dict(measure_callable(collfunc, rounds),
+                                                    **measure_allocation(collfunc))
+
+    def full_sample():
+        # Forgetting the cadence bookkeeping makes every section due, the worst case tick
+        sampler.lastseen = {}
+        sampler.collect_sample()
+
+    retndata["sample"] = dict(measure_callable(full_sample, rounds), **measure_allocation(full_sample))
+    appobjc = falcon.App(middleware=[encd.CompressionMiddleware(encd.ResponseEncoder())])
+    appobjc.add_route("/livesync", LiveUpdatingEndpoint("synthetic", sampler))
+    appobjc.add_route("/deadsync", DeadUpdatingEndpoint("synthetic", procback, sampler))
+    clntobjc = falcon.testing.TestClient(appobjc)
+    gzipheader = {"Accept-Encoding": "gzip"}
+
+    def fresh_sample():
+        host.advance()
+        full_sample()
+
+    retndata["livesync"] = measure_requests(clntobjc, "/livesync", rounds)
+    retndata["livesync_gzip"] = measure_requests(clntobjc, "/livesync", rounds, gzipheader)
+    # Every request lands on a new snapshot, so each one pays serialization instead of hitting the cache
+    retndata["livesync_fresh"] = measure_requests(clntobjc, "/livesync", rounds, beforefunc=fresh_sample)
+    retndata["deadsync"] = measure_requests(clntobjc, "/deadsync", rounds)
+    retndata["deadsync_gzip"] = measure_requests(clntobjc, "/deadsync", rounds, gzipheader)
+    return retndata
+
+
+@benchfunc.command("synthetic")
+@click.option("-p", "--procs", "procs", help="Set the process counts to step through.", default="10,100,1000,10000")
+@click.option("-u", "--cpus", "cpus", help="Set the number of synthetic CPUs.", default=4)
+@click.option("-d", "--disks", "disks", help="Set the number of synthetic disks.", default=2)
+@click.option("-i", "--nics", "nics", help="Set the number of synthetic network interfaces.", default=2)
+@click.option("-s", "--chips", "chips", help="Set the number of synthetic sensor chips.", default=2)
+@click.option("-g", "--cgroups", "cgroups", help="Set the number of synthetic cgroups.", default=8)
+@click.option("-b", "--backend", "backends", help="Set the process backends to measure.", default="psutil,procfs")
+@click.option("-n", "--rounds", "rounds", help="Set the number of timed rounds.", default=10)
+@click.option("-e", "--seed", "seed", help="Set the seed for the synthetic host layout.", default=0)
+def synthetic(procs, cpus, disks, nics, chips, cgroups, backends, rounds, seed):
+    for procqant in [int(indx) for indx in procs.split(",")]:
+        with tempfile.TemporaryDirectory(prefix="pimonitor-") as rootpath:
+            host = SyntheticHost(rootpath, procqant, cpus, disks, nics, chips, cgroups=cgroups, seed=seed)
+            with host.installed():
+                for procback in backends.split(","):
+                    retndata = synthetic_round(host, procback, rounds)
+                    retndata.update(cpus=cpus, disks=disks, nics=nics, chips=chips, cgroups=cgroups, seed=seed)
+                    click.echo(json.dumps({"synthetic": retndata}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    benchfunc()
@@ -0,0 +1,209 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import os
+
+import psutil
+
+# cpu.stat, memory.stat and io.stat keys kept per cgroup, under the names they are served with
+CPU_STAT_KEYS = {
+    "usage_usec": "cpu_usage_usec",
+    "user_usec": "cpu_user_usec",
+    "system_usec": "cpu_system_usec",
+    "nr_throttled": "nr_throttled",
+    "throttled_usec": "throttled_usec",
+}
+MEMORY_STAT_KEYS = {
+    "anon": "memory_anon",
+    "file": "memory_file",
+    "kernel": "memory_kernel",
+    "shmem": "memory_shmem",
+    "pgmajfault": "pgmajfault",
+}
+IO_STAT_KEYS = {
+    "rbytes": "io_rbytes",
+    "wbytes": "io_wbytes",
+    "rios": "io_rios",
+    "wios": "io_wios",
+}
+CGROUP_RATE_MAPS = {
+    "cpu_usage_usec": "cpu_percent",
+    "throttled_usec": "throttled_percent",
+    "io_rbytes": "read_bytes_rate",
+    "io_wbytes": "write_bytes_rate",
+    "pgmajfault": "pgmajfault_rate",
+}
+
+
+def read_text(filepath):
+    with open(filepath, "r") as fileobjc:
+        return fileobjc.read()
+
+
+def read_flat_keyed(filepath, keymaps, singlist):
+    try:
+        content = read_text(filepath)
+    except OSError:
+        return
+    for line in content.splitlines():
+        partlist = line.split()
+        if len(partlist) == 2 and partlist[0] in keymaps:
+            singlist[keymaps[partlist[0]]] = int(partlist[1])
+
+
+def read_io_stat(filepath, singlist):
+    # One line per device of key=value pairs, served as totals across devices
+    for indx in IO_STAT_KEYS.values():
+        singlist[indx] = 0
+    try:
+        content = read_text(filepath)
+    except OSError:
+        return
+    for line in content.splitlines():
+        for jndx in line.split()[1:]:
+            statname, _, value = jndx.partition("=")
+            if statname in IO_STAT_KEYS:
+                singlist[IO_STAT_KEYS[statname]] += int(value)
+
+
+def read_limit(filepath):
+    try:
+        value = read_text(filepath).strip()
+    except OSError:
+        return None
+    return None if value == "max" else int(value)
+
+
+def read_cgroup_procs(filepath):
+    try:
+        return [int(indx) for indx in read_text(filepath).split()]
+    except (OSError, ValueError):
+        return []
+
+
+def find_cgroup_root(procpath=None):
+    # Hybrid hosts mount the unified hierarchy somewhere other than /sys/fs/cgroup
+    try:
+        content = read_text(os.path.join(procpath or psutil.PROCFS_PATH, "self", "mounts"))
+    except OSError:
+        return None
+    for line in content.splitlines():
+        partlist = line.split()
+        if len(partlist) >= 3 and partlist[2] == "cgroup2":
+            return partlist[1].replace("\\040", " ")
+    return None
+
+
+def read_process_cgroup(prociden, procpath=None):
+    try:
+        content = read_text(os.path.join(procpath or psutil.PROCFS_PATH, str(prociden), "cgroup"))
+    except OSError:
+        return None
+    for line in content.splitlines():
+        if line.startswith("0::"):
+            return line[3:]
+    return None
+
+
+class CgroupCollector:
+    def __init__(self, rootpath=None, procpath=None):
+        self.procpath = procpath
+        self.rootpath = rootpath or find_cgroup_root(procpath)
+        self.procmaps = {}
+        self.inodes = {}
+        self.recreated = set()
+
+    def available(self):
+        return self.rootpath is not None and os.path.isdir(self.rootpath)
+
+    def read_cgroup(self, dirpath):
+        singlist = {}
+        read_flat_keyed(os.path.join(dirpath, "cpu.stat"), CPU_STAT_KEYS, singlist)
+        read_flat_keyed(os.path.join(dirpath, "memory.stat"), MEMORY_STAT_KEYS, singlist)
+        read_io_stat(os.path.join(dirpath, "io.stat"), singlist)
+        for indx in CPU_STAT_KEYS.values():
+            singlist.setdefault(indx, 0)
+        for indx in MEMORY_STAT_KEYS.values():
+            singlist.setdefault(indx, 0)
+        # The root cgroup has no memory.current, its children add up to it instead
+        singlist["memory_current"] = read_limit(os.path.join(dirpath, "memory.current"))
+        singlist["memory_max"] = read_limit(os.path.join(dirpath, "memory.max"))
+        singlist["pids_current"] = read_limit(os.path.join(dirpath, "pids.current"))
+        return singlist
+
+    def collect(self):
+        retndata, procmaps, inodes = {}, {}, {}
+        if not self.available():
+            self.procmaps = procmaps
+            self.recreated = set()
+            return retndata
+        rootpath = self.rootpath.rstrip("/")
+        # One walk reads the statistics and the member PIDs of every cgroup
+        for dirpath, dirnames, filenames in os.walk(self.rootpath):
+            cgrppath = dirpath[len(rootpath):] or "/"
+            try:
+                inodes[cgrppath] = os.stat(dirpath).st_ino
+                singlist = self.read_cgroup(dirpath)
+            except (OSError, ValueError, IndexError):
+                continue
+            proclist = read_cgroup_procs(os.path.join(dirpath, "cgroup.procs"))
+            singlist["nr_procs"] = len(proclist)
+            for prociden in proclist:
+                procmaps[prociden] = cgrppath
+            retndata[cgrppath] = singlist
+        # A restarted service gets a new cgroup under the same path, its counters start over from zero
+        self.recreated = {indx for indx, inode in inodes.items() if self.inodes.get(indx, inode) != inode}
+        self.inodes = inodes
+        # Swapped in whole, so readers never see a half-built mapping
+        self.procmaps = procmaps
+        return retndata
+
+    def return_process_cgroup(self, prociden):
+        cgrppath = self.procmaps.get(prociden)
+        if cgrppath is None:
+            # Processes started after the last walk are looked up on their own
+            cgrppath = read_process_cgroup(prociden, self.procpath)
+        return cgrppath
+
+
+def group_process_listing(procrows, collector, cgrpinfo):
+    groups = {}
+    # Groups come out in the order of their first row, so they follow the requested sort
+    for singlist in procrows:
+        cgrppath = collector.return_process_cgroup(singlist["pid"]) or "unknown"
+        grupdata = groups.get(cgrppath)
+        if grupdata is None:
+            cgrpstat = cgrpinfo.get(cgrppath, {})
+            grupdata = {
+                "cgroup": cgrppath,
+                "cpu_percent": 0.0,
+                "memory_percent": 0.0,
+                "rss": 0,
+                "cgroup_cpu_percent": cgrpstat.get("cpu_percent"),
+                "memory_current": cgrpstat.get("memory_current"),
+                "procinfo": [],
+            }
+            groups[cgrppath] = grupdata
+        grupdata["cpu_percent"] = round(grupdata["cpu_percent"] + (singlist["cpu_percent"] or 0.0), 1)
+        grupdata["memory_percent"] = round(grupdata["memory_percent"] + (singlist["memory_percent"] or 0.0), 3)
+        grupdata["rss"] += singlist.get("rss") or 0
+        grupdata["procinfo"].append(singlist)
+    return list(groups.values())
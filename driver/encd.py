@@ -0,0 +1,160 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import gzip
+import json
+import threading
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/openmetrics-text", "text/",
+                      "image/svg+xml")
+
+
+def encode_json(retnjson):
+    if orjson is not None:
+        return orjson.dumps(retnjson, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(retnjson, ensure_ascii=False).encode("utf-8")
+
+
+def json_backend_name():
+    return "orjson v" + orjson.__version__ if orjson is not None else "json (stdlib)"
+
+
+class ResponseEncoder:
+    def __init__(self, minsize=1024, gziplevl=6, brotqual=5):
+        self.minsize = minsize
+        self.gziplevl = gziplevl
+        self.brotqual = brotqual
+        self.encoders = ["br", "gzip", "deflate"] if brotli is not None else ["gzip", "deflate"]
+        # Running compression ratio, it raises the size floor while payloads barely shrink
+        self.ratio = 0.5
+
+    def parse_accept_encoding(self, acptenco):
+        retndata = {}
+        for indx in (acptenco or "").split(","):
+            partlist = indx.strip().split(";")
+            if not partlist[0]:
+                continue
+            qualvalu = 1.0
+            for jndx in partlist[1:]:
+                jndx = jndx.strip()
+                if jndx.startswith("q="):
+                    try:
+                        qualvalu = float(jndx[2:])
+                    except ValueError:
+                        qualvalu = 0.0
+            retndata[partlist[0].strip().lower()] = qualvalu
+        return retndata
+
+    def negotiate(self, acptenco, bodysize):
+        minsize = self.minsize if self.ratio < 0.9 else self.minsize * 16
+        if not acptenco or bodysize < minsize:
+            return "identity"
+        qualdict = self.parse_accept_encoding(acptenco)
+        wildcard = qualdict.get("*", 0.0)
+        bestenco, bestqual = "identity", 0.0
+        for indx in self.encoders:
+            qualvalu = qualdict.get(indx, wildcard)
+            if qualvalu > bestqual:
+                bestenco, bestqual = indx, qualvalu
+        return bestenco
+
+    def compress(self, bodydata, contenco):
+        if contenco == "br":
+            compdata = brotli.compress(bodydata, quality=self.brotqual)
+        elif contenco == "gzip":
+            compdata = gzip.compress(bodydata, compresslevel=self.gziplevl, mtime=0)
+        elif contenco == "deflate":
+            compdata = zlib.compress(bodydata, self.gziplevl)
+        else:
+            return bodydata
+        if bodydata:
+            self.ratio = 0.8 * self.ratio + 0.2 * (len(compdata) / len(bodydata))
+        return compdata
+
+
+class EncodedSnapshotCache:
+    def __init__(self, respenco):
+        self.respenco = respenco
+        self.seqnumbr = None
+        self.entries = {}
+        self.lockobjc = threading.Lock()
+
+    def fetch(self, seqnumbr, cachekey, acptenco, buildfunc):
+        with self.lockobjc:
+            if seqnumbr != self.seqnumbr:
+                self.seqnumbr = seqnumbr
+                self.entries = {}
+            entry = self.entries.get(cachekey)
+        if entry is None:
+            entry = {"identity": encode_json(buildfunc())}
+            with self.lockobjc:
+                if self.seqnumbr == seqnumbr:
+                    entry = self.entries.setdefault(cachekey, entry)
+        contenco = self.respenco.negotiate(acptenco, len(entry["identity"]))
+        if contenco not in entry:
+            # Every client on the same snapshot shares one serialization and one compression per encoding
+            entry[contenco] = self.respenco.compress(entry["identity"], contenco)
+        return contenco, entry[contenco]
+
+
+class CompressionMiddleware:
+    def __init__(self, respenco):
+        self.respenco = respenco
+
+    def compress_response(self, rqst, resp, bodydata):
+        contenco = self.respenco.negotiate(rqst.get_header("Accept-Encoding"), len(bodydata))
+        resp.append_header("Vary", "Accept-Encoding")
+        if contenco != "identity":
+            resp.text = None
+            resp.data = self.respenco.compress(bodydata, contenco)
+            resp.set_header("Content-Encoding", contenco)
+
+    def skip_response(self, resp):
+        # Responders that negotiated their own encoding already declared Vary
+        if resp.stream is not None or "Accept-Encoding" in (resp.get_header("Vary") or ""):
+            return True
+        # Responses without an explicit type go out as the app default of JSON
+        return not (resp.content_type or "application/json").startswith(COMPRESSIBLE_TYPES)
+
+    def process_response(self, rqst, resp, resource, req_succeeded):
+        if self.skip_response(resp):
+            return
+        bodydata = resp.render_body()
+        if bodydata:
+            self.compress_response(rqst, resp, bodydata)
+
+    async def process_response_async(self, rqst, resp, resource, req_succeeded):
+        if self.skip_response(resp):
+            return
+        bodydata = await resp.render_body()
+        if bodydata:
+            self.compress_response(rqst, resp, bodydata)
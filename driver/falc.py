@@ -19,69 +19,353 @@
 ##########################################################################
 """
 
-import json
+import asyncio
+import functools
+import gzip
+import hashlib
 import os
 import mimetypes
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
 
 import click
 import falcon
 from falcon import __version__ as flcnvers
 from hard import (
+    DEAD_STATIC_SECTIONS,
     ConnectionManager,
     DeadUpdatingElements,
-    LiveUpdatingElements,
+    PROCESS_ACTIONS,
+    LiveSampler,
+    ProcessDispatcher,
     ProcessHandler,
+    ProcessTree,
+    format_sequence_token,
+    parse_sequence_token,
+    select_process_listing,
 )
+from alrt import AlertEngine, LogSink, WebhookSink, read_rules_file
+from cgrp import group_process_listing
+from encd import (
+    COMPRESSIBLE_TYPES,
+    CompressionMiddleware,
+    EncodedSnapshotCache,
+    ResponseEncoder,
+    brotli,
+    encode_json,
+    json_backend_name,
+)
+from flet import FleetAggregator, read_fleet_file
+from hist import HistoryRecorder, HistoryStore
+from stor import DiskHistoryStore
+from inst import RequestTimingMiddleware, SelfStatistics
+from prom import OPENMETRICS_TYPE, PLAINTEXT_TYPE, MetricsRenderer
 from psutil import __version__ as psutvers
-from werkzeug import serving
-try:
-    from werkzeug import __version__ as wkzgvers
-except ImportError:
-    import importlib.metadata
-    wkzgvers = importlib.metadata.version('werkzeug')
+
+# systemd hands activated sockets over starting at this descriptor
+SD_LISTEN_FDS_START = 3
 
 
 class LiveUpdatingEndpoint(object):
-    def __init__(self, passcode):
+    def __init__(self, passcode, sampler, respenco=None):
         self.passcode = passcode
+        self.sampler = sampler
+        self.snapcach = EncodedSnapshotCache(respenco or ResponseEncoder())
+
+    def on_get(self, rqst, resp):
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+        passcode = rqst.get_param("passcode")
+        if passcode != self.passcode:
+            resp.data = encode_json({"retnmesg": "deny"})
+            return
+        sections = rqst.get_param_as_list("fields", delimiter=",")
+        basetokn = rqst.get_param("since")
+        # Read once, so the cache key and the payload always describe the same snapshot
+        snapshot = self.sampler.latest_snapshot()
+        seqnumbr = snapshot.seqnumbr if snapshot is not None else None
+        sectkeys = tuple(sections) if sections is not None else None
+        if basetokn is None:
+            contenco, resp.data = self.snapcach.fetch(
+                seqnumbr, ("full", sectkeys), rqst.get_header("Accept-Encoding"),
+                lambda: self.sampler.return_live_data(sections, snapshot)
+            )
+        else:
+            baseepch, basenmbr = parse_sequence_token(basetokn)
+            if baseepch != self.sampler.epoch:
+                basenmbr = None
+            contenco, resp.data = self.snapcach.fetch(
+                seqnumbr, ("delta", basenmbr, sectkeys), rqst.get_header("Accept-Encoding"),
+                lambda: self.sampler.return_delta_data(basenmbr, sections, baseepch, snapshot)
+            )
+        resp.append_header("Vary", "Accept-Encoding")
+        if contenco != "identity":
+            resp.set_header("Content-Encoding", contenco)
+
+
+class LiveStreamingEndpoint(object):
+    def __init__(self, passcode, sampler, keepalive=15.0):
+        self.passcode = passcode
+        self.sampler = sampler
+        self.keepalive = keepalive
+
+    def resume_point(self, baseepch, basenmbr):
+        snapshot = self.sampler.snapshot
+        # Ids from an earlier run, or beyond the current sequence, start over with an immediate full frame
+        if baseepch != self.sampler.epoch or basenmbr is None or snapshot is None or basenmbr > snapshot.seqnumbr:
+            return -1
+        return basenmbr
+
+    def stream_events(self, baseepch, basenmbr, pushrate, sections):
+        basenmbr = self.resume_point(baseepch, basenmbr)
+        nextpush = 0.0
+        while not self.sampler.stopflag.is_set():
+            snapshot = self.sampler.wait_snapshot(basenmbr, self.keepalive)
+            if snapshot is None or snapshot.seqnumbr <= basenmbr:
+                yield b": keepalive\n\n"
+                continue
+            waittime = nextpush - time.monotonic()
+            if waittime > 0:
+                time.sleep(waittime)
+                continue
+            retnjson = self.sampler.return_delta_data(basenmbr, sections, self.sampler.epoch, snapshot)
+            basenmbr = retnjson["seqnumbr"]
+            nextpush = time.monotonic() + pushrate
+            yield b"id: %s\ndata: %s\n\n" % (format_sequence_token(retnjson["epoch"], basenmbr).encode(),
+                                                encode_json(retnjson))
+
+    def on_get(self, rqst, resp):
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+        passcode = rqst.get_param("passcode")
+        if passcode != self.passcode:
+            resp.data = encode_json({"retnmesg": "deny"})
+            return
+        sections = rqst.get_param_as_list("fields", delimiter=",")
+        pushrate = max(rqst.get_param_as_float("rate", default=self.sampler.interval), self.sampler.interval)
+        # EventSource reconnects carry the last seen id so the stream resumes with a delta
+        baseepch, basenmbr = parse_sequence_token(rqst.get_header("Last-Event-ID") or rqst.get_param("since"))
+        resp.content_type = "text/event-stream"
+        resp.set_header("Cache-Control", "no-cache")
+        resp.stream = self.stream_events(baseepch, basenmbr, pushrate, sections)
+
+
+class AsyncLiveStreamingEndpoint(LiveStreamingEndpoint):
+    def __init__(self, passcode, sampler, executor, keepalive=15.0):
+        super().__init__(passcode, sampler, keepalive)
+        self.executor = executor
+
+    def encode_delta(self, basenmbr, sections, snapshot):
+        retnjson = self.sampler.return_delta_data(basenmbr, sections, self.sampler.epoch, snapshot)
+        return retnjson["seqnumbr"], format_sequence_token(retnjson["epoch"], retnjson["seqnumbr"]), \
+            encode_json(retnjson)
+
+    async def stream_events(self, baseepch, basenmbr, pushrate, sections):
+        basenmbr = self.resume_point(baseepch, basenmbr)
+        loop = asyncio.get_running_loop()
+        lastsent = time.monotonic()
+        # Polling the published snapshot keeps idle streams off the executor threads
+        while not self.sampler.stopflag.is_set():
+            snapshot = self.sampler.snapshot
+            if snapshot is None or snapshot.seqnumbr <= basenmbr:
+                if time.monotonic() - lastsent >= self.keepalive:
+                    lastsent = time.monotonic()
+                    yield b": keepalive\n\n"
+                await asyncio.sleep(self.sampler.interval / 4)
+                continue
+            basenmbr, evntiden, jsontext = await loop.run_in_executor(self.executor, self.encode_delta, basenmbr,
+                                                                      sections, snapshot)
+            lastsent = time.monotonic()
+            yield b"id: %s\ndata: %s\n\n" % (evntiden.encode(), jsontext)
+            await asyncio.sleep(pushrate)
+
+    async def on_get(self, rqst, resp):
+        super().on_get(rqst, resp)
+
+
+class ExecutorResource(object):
+    def __init__(self, resource, executor):
+        self.resource = resource
+        self.executor = executor
+
+    async def on_get(self, rqst, resp, **kwargs):
+        # psutil calls block, so the synchronous responder runs on the bounded executor
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, functools.partial(self.resource.on_get, rqst, resp, **kwargs))
+
+
+class ProcessListingEndpoint(object):
+    def __init__(self, passcode, sampler):
+        self.passcode = passcode
+        self.sampler = sampler
 
     def on_get(self, rqst, resp):
         passcode = rqst.get_param("passcode")
         if passcode == self.passcode:
-            retnjson = LiveUpdatingElements().return_live_data()
+            grouping = rqst.get_param("group") == "cgroup"
+            livedata = self.sampler.return_live_data(["procinfo", "cgrpinfo"] if grouping else ["procinfo"])
+            procinfo = livedata.get("procinfo", {})
+            retnjson = select_process_listing(
+                procinfo,
+                sortkey=rqst.get_param("sort", default="cpu_percent"),
+                descend=rqst.get_param("order", default="desc") != "asc",
+                limit=rqst.get_param_as_int("limit"),
+                offset=rqst.get_param_as_int("offset", default=0),
+                namefilt=rqst.get_param("name"),
+                userfilt=rqst.get_param("user"),
+                mincpu=rqst.get_param_as_float("mincpu"),
+                minmem=rqst.get_param_as_float("minmem"),
+            )
+            if grouping:
+                retnjson["groups"] = group_process_listing(retnjson.pop("procinfo"), self.sampler.elements.cgroups,
+                                                           livedata.get("cgrpinfo", {}))
         else:
             retnjson = {"retnmesg": "deny"}
-        resp.text = json.dumps(retnjson, ensure_ascii=False)
+        resp.data = encode_json(retnjson)
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.status = falcon.HTTP_200
 
 
-class DeadUpdatingEndpoint(object):
-    def __init__(self, passcode):
+class ProcessTreeEndpoint(object):
+    def __init__(self, passcode, sampler):
+        self.passcode = passcode
+        self.sampler = sampler
+        self.treecach = (None, None)
+
+    def return_process_tree(self):
+        procinfo = self.sampler.return_live_data(["procinfo"]).get("procinfo", {})
+        # The index is built once per sampled listing and shared by every request on it
+        treecach = self.treecach
+        if treecach[0] is not procinfo:
+            treecach = (procinfo, ProcessTree(procinfo))
+            self.treecach = treecach
+        return treecach[1]
+
+    def on_get(self, rqst, resp):
+        passcode = rqst.get_param("passcode")
+        if passcode == self.passcode:
+            retnjson = self.return_process_tree().return_tree(rqst.get_param_as_int("root"),
+                                                              rqst.get_param_as_int("depth"))
+        else:
+            retnjson = {"retnmesg": "deny"}
+        resp.data = encode_json(retnjson)
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+
+
+class CgroupListingEndpoint(object):
+    def __init__(self, passcode, sampler):
+        self.passcode = passcode
+        self.sampler = sampler
+
+    def on_get(self, rqst, resp):
+        passcode = rqst.get_param("passcode")
+        if passcode == self.passcode:
+            cgrpinfo = self.sampler.return_live_data(["cgrpinfo"]).get("cgrpinfo", {})
+            prefix = rqst.get_param("prefix")
+            if prefix:
+                cgrpinfo = {indx: value for indx, value in cgrpinfo.items() if indx.startswith(prefix)}
+            retnjson = {
+                "available": self.sampler.elements.cgroups.available(),
+                "rootpath": self.sampler.elements.cgroups.rootpath,
+                "cgrpinfo": cgrpinfo,
+            }
+        else:
+            retnjson = {"retnmesg": "deny"}
+        resp.data = encode_json(retnjson)
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+
+
+class HistoryEndpoint(object):
+    def __init__(self, passcode, histstor, diskstor=None):
         self.passcode = passcode
+        self.histstor = histstor
+        self.diskstor = diskstor
 
     def on_get(self, rqst, resp):
         passcode = rqst.get_param("passcode")
         if passcode == self.passcode:
-            retnjson = DeadUpdatingElements().return_dead_data()
+            metrlist = rqst.get_param_as_list("metric", delimiter=",")
+            if metrlist is None:
+                retnjson = {"metrics": self.histstor.return_metric_names()}
+            else:
+                stoptime = rqst.get_param_as_float("end", default=time.time())
+                strttime = rqst.get_param_as_float("start", default=stoptime - 600)
+                histsrce = rqst.get_param("source")
+                if histsrce is None and self.diskstor is not None:
+                    # Ranges reaching past what memory holds are answered from the segment files
+                    histsrce = "disk" if strttime < self.histstor.return_coverage_start() else "memory"
+                if histsrce == "disk" and self.diskstor is not None:
+                    retnjson = self.diskstor.query(metrlist, strttime, stoptime, rqst.get_param_as_float("step"))
+                else:
+                    retnjson = self.histstor.query(metrlist, strttime, stoptime, rqst.get_param_as_float("step"))
         else:
             retnjson = {"retnmesg": "deny"}
-        resp.text = json.dumps(retnjson, ensure_ascii=False)
+        resp.data = encode_json(retnjson)
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.status = falcon.HTTP_200
 
 
+class DeadUpdatingEndpoint(object):
+    """
+    Serves the slowly changing host facts, with an ETag only when every requested field is a static one
+    since the live sections change with every sample and could never match If-None-Match
+    """
+
+    def __init__(self, passcode, procback="psutil", sampler=None):
+        self.passcode = passcode
+        self.elements = DeadUpdatingElements(procback, sampler)
+
+    def on_get(self, rqst, resp):
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+        passcode = rqst.get_param("passcode")
+        if passcode != self.passcode:
+            resp.data = encode_json({"retnmesg": "deny"})
+            return
+        fields = rqst.get_param_as_list("fields", delimiter=",")
+        bodydata = encode_json(self.elements.return_dead_data(fields))
+        if fields is None or not DEAD_STATIC_SECTIONS.issuperset(fields):
+            resp.data = bodydata
+            return
+        # Weak, since the compression middleware may change the bytes on the wire
+        etagvalu = 'W/"%s"' % hashlib.blake2b(bodydata, digest_size=8).hexdigest()
+        resp.set_header("ETag", etagvalu)
+        resp.set_header("Access-Control-Expose-Headers", "ETag")
+        nonematc = rqst.get_header("If-None-Match") or ""
+        if etagvalu[2:] in [indx.strip().replace("W/", "", 1) for indx in nonematc.split(",")]:
+            resp.status = falcon.HTTP_304
+            return
+        resp.data = bodydata
+
+
 class ProcessHandlingEndpoint(object):
-    def __init__(self, passcode):
+    def __init__(self, passcode, procback="psutil"):
         self.passcode = passcode
+        self.procback = procback
 
     def on_get(self, rqst, resp):
         passcode = rqst.get_param("passcode")
         if passcode == self.passcode:
-            retnjson = ProcessHandler(int(rqst.get_param("prociden"))).return_process_info()
+            fields = rqst.get_param_as_list("fields", delimiter=",")
+            pidslist = rqst.get_param_as_list("pids", transform=int, delimiter=",")
+            if pidslist is not None:
+                retnjson = {
+                    "procinfo": {
+                        indx: ProcessHandler(indx, self.procback).return_process_result(fields) for indx in pidslist
+                    }
+                }
+            else:
+                prociden = rqst.get_param_as_int("prociden", required=True)
+                retnjson = ProcessHandler(prociden, self.procback).return_process_result(fields)
         else:
             retnjson = {"retnmesg": "deny"}
-        resp.text = json.dumps(retnjson, ensure_ascii=False)
+        resp.data = encode_json(retnjson)
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.status = falcon.HTTP_200
 
@@ -96,7 +380,7 @@ class ProcessKillingEndpoint(object):
             retnjson = ProcessHandler(int(rqst.get_param("prociden"))).process_killer()
         else:
             retnjson = {"retnmesg": "deny"}
-        resp.text = json.dumps(retnjson, ensure_ascii=False)
+        resp.data = encode_json(retnjson)
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.status = falcon.HTTP_200
 
@@ -111,7 +395,7 @@ class ProcessTerminatingEndpoint(object):
             retnjson = ProcessHandler(int(rqst.get_param("prociden"))).process_terminator()
         else:
             retnjson = {"retnmesg": "deny"}
-        resp.text = json.dumps(retnjson, ensure_ascii=False)
+        resp.data = encode_json(retnjson)
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.status = falcon.HTTP_200
 
@@ -126,7 +410,7 @@ class ProcessSuspendingEndpoint(object):
             retnjson = ProcessHandler(int(rqst.get_param("prociden"))).process_suspender()
         else:
             retnjson = {"retnmesg": "deny"}
-        resp.text = json.dumps(retnjson, ensure_ascii=False)
+        resp.data = encode_json(retnjson)
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.status = falcon.HTTP_200
 
@@ -141,41 +425,288 @@ class ProcessResumingEndpoint(object):
             retnjson = ProcessHandler(int(rqst.get_param("prociden"))).process_resumer()
         else:
             retnjson = {"retnmesg": "deny"}
-        resp.text = json.dumps(retnjson, ensure_ascii=False)
+        resp.data = encode_json(retnjson)
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.status = falcon.HTTP_200
 
 
-class StaticFileHandler:
-    def __init__(self, static_dir):
-        self.static_dir = static_dir
+class ProcessControllingEndpoint(object):
+    def __init__(self, passcode):
+        self.passcode = passcode
+
+    def on_get(self, rqst, resp):
+        passcode = rqst.get_param("passcode")
+        if passcode == self.passcode:
+            action = rqst.get_param("action")
+            if action not in PROCESS_ACTIONS and action != "termkill":
+                retnjson = {"retnmesg": "badaction"}
+            else:
+                dispatch = ProcessDispatcher()
+                selected, failures = dispatch.select_processes(
+                    pidslist=rqst.get_param_as_list("pids", transform=int, delimiter=","),
+                    namepatn=rqst.get_param("name"),
+                    username=rqst.get_param("user"),
+                    treeroot=rqst.get_param_as_int("tree"),
+                    withroot=rqst.get_param_as_bool("withroot", default=True),
+                )
+                retnjson = dispatch.dispatch(action, selected, failures,
+                                             rqst.get_param_as_float("timeout", default=3.0))
+        else:
+            retnjson = {"retnmesg": "deny"}
+        resp.data = encode_json(retnjson)
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
 
-    def on_get(self, req, resp, filepath='index.html'):
-        if not filepath:
-            filepath = 'index.html'
 
-        full_path = os.path.join(self.static_dir, filepath)
+class MetricsExposingEndpoint(object):
+    def __init__(self, passcode, sampler):
+        self.passcode = passcode
+        self.renderer = MetricsRenderer(sampler)
 
+    def on_get(self, rqst, resp):
+        resp.status = falcon.HTTP_200
+        # Prometheus can send the passcode as a bearer token instead of a query parameter
+        authdata = rqst.get_header("Authorization") or ""
+        passcode = authdata[7:] if authdata.startswith("Bearer ") else rqst.get_param("passcode")
+        if passcode != self.passcode:
+            resp.status = falcon.HTTP_401
+            resp.data = encode_json({"retnmesg": "deny"})
+            return
+        openmtrc = "application/openmetrics-text" in (rqst.get_header("Accept") or "")
+        resp.content_type = OPENMETRICS_TYPE if openmtrc else PLAINTEXT_TYPE
+        resp.data = self.renderer.render(openmtrc)
+
+
+class SelfStatisticsEndpoint(object):
+    def __init__(self, passcode, selfstat):
+        self.passcode = passcode
+        self.selfstat = selfstat
+
+    def on_get(self, rqst, resp):
+        passcode = rqst.get_param("passcode")
+        if passcode == self.passcode:
+            retnjson = self.selfstat.return_self_stats()
+        else:
+            retnjson = {"retnmesg": "deny"}
+        resp.data = encode_json(retnjson)
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+
+
+class AlertListingEndpoint(object):
+    def __init__(self, passcode, alrtengn):
+        self.passcode = passcode
+        self.alrtengn = alrtengn
+
+    def on_get(self, rqst, resp):
+        passcode = rqst.get_param("passcode")
+        if passcode == self.passcode:
+            retnjson = self.alrtengn.return_alert_data()
+        else:
+            retnjson = {"retnmesg": "deny"}
+        resp.data = encode_json(retnjson)
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+
+
+class FleetSyncingEndpoint(object):
+    def __init__(self, passcode, aggregator):
+        self.passcode = passcode
+        self.aggregator = aggregator
+
+    def on_get(self, rqst, resp):
+        resp.set_header("Access-Control-Allow-Origin", "*")
+        resp.status = falcon.HTTP_200
+        passcode = rqst.get_param("passcode")
+        if passcode != self.passcode:
+            resp.data = encode_json({"retnmesg": "deny"})
+            return
+        hostname = rqst.get_param("host")
+        if hostname is None:
+            retnjson = self.aggregator.return_fleet_data()
+        else:
+            retnjson = self.aggregator.return_host_data(hostname, rqst.get_param_as_list("fields", delimiter=","))
+            if retnjson is None:
+                resp.status = falcon.HTTP_404
+                retnjson = {"retnmesg": "nohost"}
+        resp.data = encode_json(retnjson)
+
+
+class StaticAsset:
+    def __init__(self, full_path, stat_info, content_type, body, variants):
+        self.full_path = full_path
+        self.mtime_ns = stat_info.st_mtime_ns
+        self.size = stat_info.st_size
+        self.content_type = content_type
+        self.last_modified = formatdate(stat_info.st_mtime, usegmt=True)
+        self.digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        # Strong validators differ per encoding, since each variant has different bytes
+        self.variants = {encoding: (data, '"%s-%s"' % (self.digest, encoding)) for encoding, data in variants.items()}
+
+
+class StaticFileHandler:
+    def __init__(self, static_dir, respenco=None, stream_size=2 * 1024 * 1024, executor=None, chunk_size=64 * 1024):
+        self.static_dir = os.path.abspath(static_dir)
+        self.respenco = respenco or ResponseEncoder()
+        self.stream_size = stream_size
+        # Set in the ASGI mode, where streamed bodies must be async and file reads must not block the loop
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def resolve_path(self, req_path):
+        full_path = os.path.abspath(os.path.join(self.static_dir, req_path.lstrip("/") or "index.html"))
         # Security: prevent path traversal
-        if not os.path.abspath(full_path).startswith(os.path.abspath(self.static_dir)):
+        if full_path != self.static_dir and not full_path.startswith(self.static_dir + os.sep):
+            return None
+        if not os.path.isfile(full_path):
+            # Serve index.html for SPA routing
+            full_path = os.path.join(self.static_dir, "index.html")
+        return full_path
+
+    def load_asset(self, full_path, stat_info):
+        content_type, _ = mimetypes.guess_type(full_path)
+        content_type = content_type or "application/octet-stream"
+        with open(full_path, "rb") as f:
+            body = f.read()
+        variants = {"identity": body}
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= self.respenco.minsize:
+            # Compressed once per file version at the strongest settings, every later request reuses it
+            variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if "br" in self.respenco.encoders:
+                variants["br"] = brotli.compress(body, quality=11)
+            variants = {encoding: data for encoding, data in variants.items() if len(data) <= len(body)}
+        return StaticAsset(full_path, stat_info, content_type, body, variants)
+
+    def fetch_asset(self, full_path, stat_info):
+        asset = self.cache.get(full_path)
+        if asset is None or asset.mtime_ns != stat_info.st_mtime_ns or asset.size != stat_info.st_size:
+            asset = self.load_asset(full_path, stat_info)
+            with self.lock:
+                self.cache[full_path] = asset
+        return asset
+
+    def pick_encoding(self, req, asset):
+        quality = self.respenco.parse_accept_encoding(req.get_header("Accept-Encoding"))
+        best_encoding, best_quality = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            encoding_quality = quality.get(encoding, quality.get("*", 0.0))
+            if encoding in asset.variants and encoding_quality > best_quality:
+                best_encoding, best_quality = encoding, encoding_quality
+        return best_encoding
+
+    def not_modified(self, req, etags):
+        if_none_match = req.get_header("If-None-Match")
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(tag in candidates for tag in etags)
+
+    async def stream_file(self, full_path):
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(self.executor, open, full_path, "rb")
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, f.read, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    def on_get(self, req, resp, filepath='index.html'):
+        full_path = self.resolve_path(req.path)
+        if full_path is None:
             resp.status = falcon.HTTP_403
             return
+        try:
+            stat_info = os.stat(full_path)
+        except OSError:
+            resp.status = falcon.HTTP_404
+            return
 
-        if not os.path.exists(full_path):
-            # Serve index.html for SPA routing
-            full_path = os.path.join(self.static_dir, 'index.html')
+        # Hashed bundle names change with their content, everything else is revalidated on each load
+        if os.path.relpath(full_path, self.static_dir).startswith("assets" + os.sep):
+            resp.cache_control = ["public", "max-age=31536000", "immutable"]
+        else:
+            resp.cache_control = ["no-cache"]
+        resp.status = falcon.HTTP_200
 
-        if os.path.exists(full_path) and os.path.isfile(full_path):
+        if stat_info.st_size > self.stream_size:
+            # Large files are streamed from disk instead of being held in the cache
+            etag = '"%x-%x"' % (stat_info.st_mtime_ns, stat_info.st_size)
+            resp.set_header("ETag", etag)
+            resp.set_header("Last-Modified", formatdate(stat_info.st_mtime, usegmt=True))
+            if self.not_modified(req, [etag]):
+                resp.status = falcon.HTTP_304
+                return
             content_type, _ = mimetypes.guess_type(full_path)
             resp.content_type = content_type or 'application/octet-stream'
-            with open(full_path, 'rb') as f:
-                resp.data = f.read()
-            resp.status = falcon.HTTP_200
-        else:
-            resp.status = falcon.HTTP_404
+            if self.executor is not None:
+                resp.set_stream(self.stream_file(full_path), stat_info.st_size)
+            else:
+                resp.set_stream(open(full_path, 'rb'), stat_info.st_size)
+            return
+
+        asset = self.fetch_asset(full_path, stat_info)
+        encoding = self.pick_encoding(req, asset)
+        body, etag = asset.variants[encoding]
+        resp.set_header("ETag", etag)
+        resp.set_header("Last-Modified", asset.last_modified)
+        # Declaring Vary here also tells the compression middleware to leave the body alone
+        resp.append_header("Vary", "Accept-Encoding")
+        if self.not_modified(req, [indx[1] for indx in asset.variants.values()]):
+            resp.status = falcon.HTTP_304
+            return
+        resp.content_type = asset.content_type
+        if encoding != "identity":
+            resp.set_header("Content-Encoding", encoding)
+        resp.data = body
+
 
+def return_activation_socket():
+    if os.environ.get("LISTEN_PID") != str(os.getpid()) or int(os.environ.get("LISTEN_FDS", "0")) < 1:
+        return None
+    # Cleared so that child processes do not mistake the socket for their own
+    for indx in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(indx, None)
+    return socket.socket(fileno=SD_LISTEN_FDS_START)
 
-main = falcon.API()
+
+def return_socket_host(sockobjc):
+    if sockobjc.family == socket.AF_INET6:
+        return "::"
+    if sockobjc.family == socket.AF_INET:
+        return "0.0.0.0"
+    return "unix://" + sockobjc.getsockname()
+
+
+def return_reference_uri(actvsock, netpdata, portdata):
+    if actvsock is None:
+        return "http://" + netpdata + ":" + portdata + "/"
+    # An inherited socket was bound by the service manager, the -p and -4/-6 options do not apply to it
+    sockname = actvsock.getsockname()
+    if actvsock.family == socket.AF_INET6:
+        return "http://[%s]:%d/" % (sockname[0], sockname[1])
+    if actvsock.family == socket.AF_INET:
+        return "http://%s:%d/" % (sockname[0], sockname[1])
+    return "unix://" + sockname
+
+
+def return_werkzeug_version():
+    try:
+        from werkzeug import __version__ as wkzgvers
+    except ImportError:
+        import importlib.metadata
+        wkzgvers = importlib.metadata.version('werkzeug')
+    return wkzgvers
+
+
+respenco = ResponseEncoder()
+selfstat = SelfStatistics()
+# Timing sits outermost, so route latency includes the compression work
+main = falcon.App(middleware=[RequestTimingMiddleware(selfstat), CompressionMiddleware(respenco)])
 
 
 @click.command()
@@ -183,11 +714,51 @@ main = falcon.API()
 @click.option("-6", "--ipprotv6", "netprotc", flag_value="ipprotv6", help="Start the server on an IPv6 address.")
 @click.option("-4", "--ipprotv4", "netprotc", flag_value="ipprotv4", help="Start the server on an IPv4 address.")
 @click.option("-c", "--passcode", "fixedpass", help="Use a fixed passcode instead of random.", default=None)
+@click.option("-i", "--interval", "intrvall", help="Set the live sampling interval in seconds.", default="1.0")
+@click.option("-r", "--cadence", "cadences", help="Set per-section refresh seconds, e.g. procinfo=5,sensread=10.",
+              default="")
+@click.option("-b", "--backend", "procback", type=click.Choice(["psutil", "procfs"]), default="psutil",
+              help="Select the process listing backend, procfs reads /proc directly on Linux.")
+@click.option("-s", "--series", "maxserie", help="Set the maximum number of history series in memory and on disk.",
+              default=128)
+@click.option("-d", "--datadir", "datadir", help="Persist history to segment files in this directory.", default=None)
+@click.option("-m", "--maxdisk", "maxdisk", help="Set the history retention size cap in megabytes.", default=64)
+@click.option("-a", "--asgi", "asgimode", is_flag=True, help="Serve an ASGI app through uvicorn instead of Werkzeug.")
+@click.option("-w", "--workers", "workers", help="Set the collector executor size for the ASGI mode.", default=4)
+@click.option("-f", "--fleet", "fleetpath", default=None,
+              help="Aggregate the downstream drivers listed in this file, kept alive only to -a downstreams.")
+@click.option("-e", "--rules", "rulepath", help="Load alert rules from this JSON file.", default=None)
+@click.option("-l", "--alertlog", "alertlog", help="Append alert events to this file instead of the console.",
+              default=None)
+@click.option("-k", "--webhook", "hookurl", help="POST alert events as JSON to this URL.", default=None)
+@click.option("-t", "--slowms", "slowms", help="Log collectors slower than this many milliseconds.", default=None,
+              type=float)
 @click.version_option(version="1.0.1", prog_name=click.style("SuperVisor Driver Service", fg="magenta"))
-def mainfunc(portdata, netprotc, fixedpass):
+def mainfunc(portdata, netprotc, fixedpass, intrvall, cadences, procback, maxserie, datadir, maxdisk, asgimode,
+             workers, fleetpath, rulepath, alertlog, hookurl, slowms):
     click.echo(" * " + click.style("SuperVisor Driver Service v1.0.1", fg="green"))
     netpdata = ""
     passcode = fixedpass if fixedpass else ConnectionManager().passphrase_generator()
+    if procback == "procfs" and not os.path.exists("/proc/self/stat"):
+        procback = "psutil"
+    cadedict = {}
+    for indx in cadences.split(","):
+        if "=" in indx:
+            sectname, sectrate = indx.split("=", 1)
+            cadedict[sectname.strip()] = float(sectrate)
+    if slowms is not None:
+        selfstat.slowms, selfstat.slowecho = slowms, True
+    # Started first, so priming the psutil baselines overlaps the server imports and resource setup
+    sampler = LiveSampler(float(intrvall), cadedict, procback=procback, selfstat=selfstat).start()
+    actvsock = return_activation_socket()
+    if asgimode:
+        try:
+            import uvicorn
+        except ImportError:
+            raise click.ClickException("The ASGI mode needs uvicorn to be installed")
+        httpserv = "Uvicorn v" + uvicorn.__version__ + " (ASGI)"
+    else:
+        httpserv = "Werkzeug v" + return_werkzeug_version()
     if netprotc == "ipprotv6":
         click.echo(" * " + click.style("IP version       ", fg="magenta") + ": " + "6")
         netpdata = "::"
@@ -195,37 +766,114 @@ def mainfunc(portdata, netprotc, fixedpass):
         click.echo(" * " + click.style("IP version       ", fg="magenta") + ": " + "4")
         netpdata = "0.0.0.0"
     click.echo(" * " + click.style("Passcode         ", fg="magenta") + ": " + passcode + "\n" +
-               " * " + click.style("Reference URI    ", fg="magenta") + ": " + "http://" + netpdata + ":" + portdata +
-               "/" + "\n" +
+               " * " + click.style("Reference URI    ", fg="magenta") + ": " +
+               return_reference_uri(actvsock, netpdata, portdata) + "\n" +
                " * " + click.style("Monitor service  ", fg="magenta") + ": " + "Psutil v" + psutvers + "\n" +
                " * " + click.style("Endpoint service ", fg="magenta") + ": " + "Falcon v" + flcnvers + "\n" +
-               " * " + click.style("HTTP server      ", fg="magenta") + ": " + "Werkzeug v" + wkzgvers)
-    livesync = LiveUpdatingEndpoint(passcode)
-    deadsync = DeadUpdatingEndpoint(passcode)
-    procinfo = ProcessHandlingEndpoint(passcode)
-    killproc = ProcessKillingEndpoint(passcode)
-    termproc = ProcessTerminatingEndpoint(passcode)
-    suspproc = ProcessSuspendingEndpoint(passcode)
-    resmproc = ProcessResumingEndpoint(passcode)
-    main.add_route("/livesync", livesync)
-    main.add_route("/deadsync", deadsync)
-    main.add_route("/procinfo", procinfo)
-    main.add_route("/killproc", killproc)
-    main.add_route("/termproc", termproc)
-    main.add_route("/suspproc", suspproc)
-    main.add_route("/resmproc", resmproc)
+               " * " + click.style("JSON encoder     ", fg="magenta") + ": " + json_backend_name() + "\n" +
+               " * " + click.style("HTTP server      ", fg="magenta") + ": " + httpserv + "\n" +
+               " * " + click.style("Sampling interval", fg="magenta") + ": " + intrvall + "s" + "\n" +
+               " * " + click.style("Process backend  ", fg="magenta") + ": " + procback)
+    if actvsock is not None:
+        click.echo(" * " + click.style("Listening socket ", fg="magenta") + ": " + "inherited fd " +
+                   str(actvsock.fileno()) + " (socket activation)")
+    histstor = HistoryStore(maxserie)
+    diskstor = None
+    if datadir:
+        diskstor = DiskHistoryStore(datadir, maxdisk * 1024 * 1024, maxseries=maxserie)
+        sampler.add_consumer(HistoryRecorder(histstor, diskstor))
+        click.echo(" * " + click.style("History storage  ", fg="magenta") + ": " + datadir + " (" +
+                   str(maxdisk) + "MB)")
+    else:
+        sampler.add_consumer(HistoryRecorder(histstor))
+    alrtsink = [LogSink(alertlog)]
+    if hookurl:
+        try:
+            alrtsink.append(WebhookSink(hookurl))
+        except ValueError as expt:
+            raise click.ClickException(str(expt))
+    try:
+        alrtengn = AlertEngine(read_rules_file(rulepath) if rulepath else None, alrtsink)
+    except (OSError, ValueError, TypeError) as expt:
+        raise click.ClickException("The alert rules could not be loaded: %s" % expt)
+    sampler.add_consumer(alrtengn)
+    click.echo(" * " + click.style("Alert rules      ", fg="magenta") + ": " + str(len(alrtengn.rules)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collector") if asgimode else None
+    routes = [
+        ("/livesync", LiveUpdatingEndpoint(passcode, sampler, respenco)),
+        ("/livestrm", AsyncLiveStreamingEndpoint(passcode, sampler, executor) if asgimode else
+         LiveStreamingEndpoint(passcode, sampler)),
+        ("/proclist", ProcessListingEndpoint(passcode, sampler)),
+        ("/proctree", ProcessTreeEndpoint(passcode, sampler)),
+        ("/cgroups", CgroupListingEndpoint(passcode, sampler)),
+        ("/history", HistoryEndpoint(passcode, histstor, diskstor)),
+        ("/deadsync", DeadUpdatingEndpoint(passcode, procback, sampler)),
+        ("/procinfo", ProcessHandlingEndpoint(passcode, procback)),
+        ("/killproc", ProcessKillingEndpoint(passcode)),
+        ("/termproc", ProcessTerminatingEndpoint(passcode)),
+        ("/suspproc", ProcessSuspendingEndpoint(passcode)),
+        ("/resmproc", ProcessResumingEndpoint(passcode)),
+        ("/procctrl", ProcessControllingEndpoint(passcode)),
+        ("/alerts", AlertListingEndpoint(passcode, alrtengn)),
+        ("/metrics", MetricsExposingEndpoint(passcode, sampler)),
+        ("/selfstats", SelfStatisticsEndpoint(passcode, selfstat)),
+    ]
+    aggregator = None
+    if fleetpath:
+        try:
+            hostlist = read_fleet_file(fleetpath)
+        except (OSError, ValueError) as expt:
+            raise click.ClickException("The fleet file could not be read: %s" % expt)
+        aggregator = FleetAggregator(hostlist, float(intrvall)).start()
+        routes.append(("/fleetsync", FleetSyncingEndpoint(passcode, aggregator)))
+        click.echo(" * " + click.style("Fleet hosts      ", fg="magenta") + ": " + str(len(hostlist)))
 
     # Serve static frontend files
     script_dir = os.path.dirname(os.path.abspath(__file__))
     static_dir = os.path.join(script_dir, '..', 'frontend', 'dist')
     if os.path.exists(static_dir):
-        static = StaticFileHandler(static_dir)
-        main.add_route("/", static)
-        main.add_route("/assets/{filepath}", static)
-        main.add_route("/{filepath}", static)
+        static = StaticFileHandler(static_dir, respenco, executor=executor)
+        routes.append(("/", static))
+        routes.append(("/assets/{filepath}", static))
+        routes.append(("/{filepath}", static))
         click.echo(" * " + click.style("Frontend         ", fg="magenta") + ": " + "Enabled")
 
-    serving.run_simple(netpdata, int(portdata), main)
+    def stop_service(signumbr, frame):
+        raise SystemExit(0)
+
+    # A service manager stops with SIGTERM, exiting through the finally block flushes the batched history
+    signal.signal(signal.SIGTERM, stop_service)
+    try:
+        if asgimode:
+            import falcon.asgi
+            asgiapps = falcon.asgi.App(middleware=[
+                RequestTimingMiddleware(selfstat),
+                CompressionMiddleware(respenco),
+            ])
+            wrappers = {}
+            for path, resource in routes:
+                if not isinstance(resource, AsyncLiveStreamingEndpoint):
+                    resource = wrappers.setdefault(id(resource), ExecutorResource(resource, executor))
+                asgiapps.add_route(path, resource)
+            if actvsock is not None:
+                uvicorn.run(asgiapps, fd=actvsock.fileno(), log_level="warning")
+            else:
+                uvicorn.run(asgiapps, host=netpdata or "0.0.0.0", port=int(portdata), log_level="warning")
+        else:
+            from werkzeug import serving
+            for path, resource in routes:
+                main.add_route(path, resource)
+            # Streaming clients hold their connection open, so each one needs its own thread
+            if actvsock is not None:
+                serving.make_server(return_socket_host(actvsock), int(portdata), main, threaded=True,
+                                    fd=actvsock.fileno()).serve_forever()
+            else:
+                serving.run_simple(netpdata, int(portdata), main, threaded=True)
+    finally:
+        if aggregator is not None:
+            aggregator.stop()
+        if diskstor is not None:
+            diskstor.close()
 
 
 if __name__ == "__main__":
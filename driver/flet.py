@@ -0,0 +1,254 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import gzip
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from hard import format_sequence_token
+
+
+def read_fleet_file(fleetpath):
+    # One downstream driver per line as "hostname baseurl passcode", blank lines and comments are skipped
+    hostlist = []
+    with open(fleetpath, "r", encoding="utf-8") as fileobjc:
+        for indx in fileobjc.read().splitlines():
+            partlist = indx.split("#", 1)[0].split()
+            if not partlist:
+                continue
+            if len(partlist) != 3:
+                raise ValueError("Malformed fleet entry: %s" % indx.strip())
+            hostlist.append(tuple(partlist))
+    return hostlist
+
+
+def apply_delta(jsonobjc, retnjson):
+    if retnjson.get("fullsync", True):
+        return retnjson.get("jsonobjc", {})
+    nextobjc = dict(jsonobjc)
+    for kind in ("added", "changed"):
+        for sectname, values in retnjson[kind].items():
+            nextobjc[sectname] = dict(nextobjc.get(sectname, {}), **values)
+    for sectname, keylist in retnjson["removed"].items():
+        sectdata = dict(nextobjc.get(sectname, {}))
+        for indx in keylist:
+            sectdata.pop(indx, None)
+        nextobjc[sectname] = sectdata
+    return nextobjc
+
+
+class FleetHost:
+    def __init__(self, hostname, baseurl, passcode, timeout=2.0, backbase=1.0, backmax=60.0):
+        self.hostname = hostname
+        self.passcode = passcode
+        self.timeout = timeout
+        self.backbase = backbase
+        self.backmax = backmax
+        urlparts = urllib.parse.urlsplit(baseurl)
+        self.urlscheme = urlparts.scheme or "http"
+        self.netloc = urlparts.netloc
+        self.pathpref = urlparts.path.rstrip("/")
+        self.connobjc = None
+        self.keepalive = None
+        self.seqnumbr = 0
+        self.epoch = None
+        self.jsonobjc = None
+        self.lastseen = None
+        self.latency = None
+        self.failures = 0
+        self.lasterror = None
+        self.retrytim = 0.0
+        self.lockobjc = threading.Lock()
+
+    def open_connection(self):
+        conncls = http.client.HTTPSConnection if self.urlscheme == "https" else http.client.HTTPConnection
+        return conncls(self.netloc, timeout=self.timeout)
+
+    def send_request(self, urlpath):
+        if self.connobjc is None:
+            self.connobjc = self.open_connection()
+        try:
+            self.connobjc.request("GET", urlpath, headers={"Accept-Encoding": "gzip"})
+            respobjc = self.connobjc.getresponse()
+            bodydata = respobjc.read()
+        except (OSError, http.client.HTTPException):
+            self.connobjc.close()
+            self.connobjc = None
+            raise
+        # Werkzeug closes after every response, only ASGI downstreams under uvicorn keep the connection open.
+        # A closed one is simply reopened on the next poll, that is not a failure
+        self.keepalive = not respobjc.will_close
+        if respobjc.will_close:
+            self.connobjc.close()
+            self.connobjc = None
+        return respobjc, bodydata
+
+    def fetch_json(self, urlpath):
+        reused = self.connobjc is not None
+        try:
+            respobjc, bodydata = self.send_request(urlpath)
+        except (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine):
+            if not reused:
+                raise
+            # The downstream may have dropped the idle keep-alive connection, retry once on a fresh one
+            respobjc, bodydata = self.send_request(urlpath)
+        if respobjc.status != 200:
+            raise http.client.HTTPException("HTTP %d" % respobjc.status)
+        if respobjc.getheader("Content-Encoding") == "gzip":
+            bodydata = gzip.decompress(bodydata)
+        return json.loads(bodydata)
+
+    def poll(self):
+        if time.monotonic() < self.retrytim:
+            return
+        urlpath = self.pathpref + "/livesync?" + urllib.parse.urlencode(
+            {"passcode": self.passcode, "since": format_sequence_token(self.epoch or "", self.seqnumbr)}
+        )
+        strttime = time.monotonic()
+        try:
+            retnjson = self.fetch_json(urlpath)
+            if retnjson.get("retnmesg") == "deny":
+                raise ValueError("passcode rejected")
+            # Deltas are asked against the last merged frame, so a steady fleet only ships what changed
+            jsonobjc = apply_delta(self.jsonobjc or {}, retnjson)
+        except (OSError, ValueError, KeyError, http.client.HTTPException) as expt:
+            with self.lockobjc:
+                self.failures += 1
+                self.lasterror = str(expt) or type(expt).__name__
+                self.retrytim = time.monotonic() + min(self.backbase * 2 ** (self.failures - 1), self.backmax)
+            return
+        with self.lockobjc:
+            # A restarted downstream answers with a new epoch and a full frame, which drops every stale key
+            self.seqnumbr = retnjson.get("seqnumbr", 0)
+            self.epoch = retnjson.get("epoch")
+            self.jsonobjc = jsonobjc
+            self.lastseen = time.time()
+            self.latency = round((time.monotonic() - strttime) * 1000, 3)
+            self.failures = 0
+            self.lasterror = None
+            self.retrytim = 0.0
+
+    def close(self):
+        if self.connobjc is not None:
+            self.connobjc.close()
+            self.connobjc = None
+
+    def return_status(self):
+        if self.failures:
+            return "down"
+        return "up" if self.jsonobjc is not None else "pending"
+
+    def return_summary(self):
+        with self.lockobjc:
+            jsonobjc = self.jsonobjc or {}
+            retndata = {
+                "status": self.return_status(),
+                "lastseen": self.lastseen,
+                "latency_ms": self.latency,
+                "failures": self.failures,
+                "error": self.lasterror,
+                "keepalive": self.keepalive,
+            }
+        cpuprcnt = list(jsonobjc.get("cpuprcnt", {}).values())
+        retndata["cpu_percent"] = round(sum(cpuprcnt) / len(cpuprcnt), 1) if cpuprcnt else None
+        retndata["memory_percent"] = jsonobjc.get("virtdata", {}).get("percent")
+        retndata["swap_percent"] = jsonobjc.get("swapinfo", {}).get("percent")
+        retndata["processes"] = len(jsonobjc["procinfo"]) if "procinfo" in jsonobjc else None
+        for sectname, ratelist in (("diousage", ("read_bytes_rate", "write_bytes_rate")),
+                                   ("netusage", ("bytes_recv_rate", "bytes_sent_rate"))):
+            for ratename in ratelist:
+                retndata[ratename] = sum(devcdata.get(ratename) or 0 for devcdata in jsonobjc[sectname].values()) \
+                    if sectname in jsonobjc else None
+        senslist = []
+        for readings in jsonobjc.get("sensread", {}).get("senstemp", {}).values():
+            for reading in readings:
+                try:
+                    senslist.append(float(reading["current"]))
+                except (TypeError, ValueError, KeyError):
+                    pass
+        retndata["temperature_max"] = max(senslist) if senslist else None
+        return retndata
+
+    def return_live_data(self, sections=None):
+        with self.lockobjc:
+            jsonobjc = self.jsonobjc or {}
+        if sections is None:
+            return jsonobjc
+        return {indx: jsonobjc[indx] for indx in sections if indx in jsonobjc}
+
+
+class FleetAggregator:
+    def __init__(self, hostlist, interval=1.0, timeout=2.0, workers=8):
+        self.interval = interval
+        self.hosts = {hostname: FleetHost(hostname, baseurl, passcode, timeout)
+                      for hostname, baseurl, passcode in hostlist}
+        self.executor = ThreadPoolExecutor(max_workers=max(min(workers, len(self.hosts)), 1),
+                                           thread_name_prefix="fleet")
+        self.inflight = {}
+        self.stopflag = threading.Event()
+        self.thrdobjc = None
+
+    def polling_loop(self):
+        while not self.stopflag.is_set():
+            strttime = time.monotonic()
+            for hostname, hostobjc in self.hosts.items():
+                # A host stuck until its timeout keeps only its own slot busy, the others stay on schedule
+                future = self.inflight.get(hostname)
+                if future is None or future.done():
+                    self.inflight[hostname] = self.executor.submit(hostobjc.poll)
+            self.stopflag.wait(max(self.interval - (time.monotonic() - strttime), 0))
+
+    def start(self):
+        if self.thrdobjc is None:
+            self.thrdobjc = threading.Thread(target=self.polling_loop, name="fleetpoller", daemon=True)
+            self.thrdobjc.start()
+        return self
+
+    def stop(self):
+        self.stopflag.set()
+        if self.thrdobjc is not None:
+            self.thrdobjc.join()
+            self.thrdobjc = None
+        self.executor.shutdown(wait=True)
+        for indx in self.hosts.values():
+            indx.close()
+
+    def return_fleet_data(self):
+        summary = {hostname: hostobjc.return_summary() for hostname, hostobjc in self.hosts.items()}
+        counts = {"up": 0, "down": 0, "pending": 0}
+        for indx in summary.values():
+            counts[indx["status"]] += 1
+        return {"counts": counts, "hosts": summary}
+
+    def return_host_data(self, hostname, sections=None):
+        hostobjc = self.hosts.get(hostname)
+        if hostobjc is None:
+            return None
+        retndata = {
+            "hostname": hostname,
+            "summary": hostobjc.return_summary(),
+            "jsonobjc": hostobjc.return_live_data(sections),
+        }
+        return retndata
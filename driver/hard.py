@@ -19,12 +19,24 @@
 ##########################################################################
 """
 
+import errno
+import fnmatch
+import functools
 import getpass
+import glob
+import heapq
 import os
+import pwd
+import select
+import socket
+import threading
 import time
-from secrets import choice
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from secrets import choice, token_hex
 
 import psutil
+from cgrp import CGROUP_RATE_MAPS, CgroupCollector
 
 
 class ConnectionManager:
@@ -33,55 +45,83 @@ class ConnectionManager:
         return retndata
 
 
+def describe_process_error(expt):
+    if isinstance(expt, psutil.NoSuchProcess):
+        errocode = errno.ESRCH
+    elif isinstance(expt, psutil.AccessDenied):
+        errocode = errno.EPERM
+    else:
+        errocode = getattr(expt, "errno", None)
+    return {"error": type(expt).__name__, "errno": errocode}
+
+
+# Fields served by /procinfo and how each psutil value is shaped for JSON
+PROCESS_DETAIL_FIELDS = {
+    "pid": None,
+    "username": None,
+    "uids": lambda uids: {"real": uids.real, "effective": uids.effective, "saved": uids.saved},
+    "memory_percent": None,
+    "name": None,
+    "create_time": time.ctime,
+    "num_ctx_switches": lambda ctxs: {"voluntary": ctxs.voluntary, "involuntary": ctxs.involuntary},
+    "cpu_percent": None,
+    "cpu_times": lambda cput: {
+        "user": cput.user,
+        "system": cput.system,
+        "children_user": cput.children_user,
+        "children_system": cput.children_system,
+        "iowait": getattr(cput, "iowait", 0),
+    },
+    "memory_info": lambda meminfo: {
+        "rss": meminfo.rss,
+        "vms": meminfo.vms,
+        "shared": getattr(meminfo, "shared", 0),
+        "text": getattr(meminfo, "text", 0),
+        "lib": getattr(meminfo, "lib", 0),
+        "data": getattr(meminfo, "data", 0),
+        "dirty": getattr(meminfo, "dirty", 0),
+    },
+    "status": None,
+    "num_threads": None,
+    "gids": lambda gids: {"real": gids.real, "effective": gids.effective, "saved": gids.saved},
+    "terminal": None,
+}
+
+
 class ProcessHandler:
-    def __init__(self, prociden):
+    def __init__(self, prociden, procback="psutil"):
         self.prociden = prociden
+        self.procback = procback
 
-    def return_process_info(self):
-        procstmp = psutil.Process(self.prociden).as_dict()
-        retndata = {
-            "pid": procstmp["pid"],
-            "username": procstmp["username"],
-            "uids": {
-                "real": procstmp["uids"].real,
-                "effective": procstmp["uids"].effective,
-                "saved": procstmp["uids"].saved
-            },
-            "memory_percent": procstmp["memory_percent"],
-            "name": procstmp["name"],
-            "create_time": time.ctime(procstmp["create_time"]),
-            "num_ctx_switches": {
-                "voluntary": procstmp["num_ctx_switches"].voluntary,
-                "involuntary": procstmp["num_ctx_switches"].involuntary,
-            },
-            "cpu_percent": procstmp["cpu_percent"],
-            "cpu_times": {
-                "user": procstmp["cpu_times"].user,
-                "system": procstmp["cpu_times"].system,
-                "children_user": procstmp["cpu_times"].children_user,
-                "children_system": procstmp["cpu_times"].children_system,
-                "iowait": procstmp["cpu_times"].iowait,
-            },
-            "memory_info": {
-                "rss": procstmp["memory_info"].rss,
-                "vms": procstmp["memory_info"].vms,
-                "shared": procstmp["memory_info"].shared,
-                "text": procstmp["memory_info"].text,
-                "lib": procstmp["memory_info"].lib,
-                "data": procstmp["memory_info"].data,
-                "dirty": procstmp["memory_info"].dirty,
-            },
-            "status": procstmp["status"],
-            "num_threads": procstmp["num_threads"],
-            "gids": {
-                "real": procstmp["gids"].real,
-                "effective": procstmp["gids"].effective,
-                "saved": procstmp["gids"].saved,
-            },
-            "terminal": procstmp["terminal"]
-        }
+    def return_process_info(self, fields=None):
+        fieldlst = [indx for indx in (fields or PROCESS_DETAIL_FIELDS) if indx in PROCESS_DETAIL_FIELDS]
+        if self.procback == "procfs":
+            try:
+                procstmp = ProcfsReader().return_process_dict(int(self.prociden))
+            except (FileNotFoundError, ProcessLookupError):
+                raise psutil.NoSuchProcess(int(self.prociden))
+            except PermissionError:
+                raise psutil.AccessDenied(int(self.prociden))
+        else:
+            proc = psutil.Process(int(self.prociden))
+            # Only the emitted attributes are collected, open files and the like are never touched
+            with proc.oneshot():
+                procstmp = proc.as_dict(attrs=fieldlst)
+        retndata = {}
+        for indx in fieldlst:
+            formfunc = PROCESS_DETAIL_FIELDS[indx]
+            value = procstmp.get(indx)
+            retndata[indx] = formfunc(value) if formfunc is not None and value is not None else value
         return retndata
 
+    def return_process_result(self, fields=None):
+        try:
+            return self.return_process_info(fields)
+        except psutil.Error as expt:
+            retndata = describe_process_error(expt)
+            retndata["pid"] = self.prociden
+            return retndata
+
     def get_single_process(self):
         try:
             return psutil.Process(int(self.prociden))
@@ -113,7 +153,754 @@ class ProcessHandler:
         return {"retnmesg": True}
 
 
+PROCESS_ACTIONS = {
+    "kill": "kill",
+    "term": "terminate",
+    "susp": "suspend",
+    "resm": "resume",
+}
+
+
+class ProcessDispatcher:
+    def describe_error(self, expt):
+        retndata = {"result": "failed"}
+        retndata.update(describe_process_error(expt))
+        return retndata
+
+    def select_processes(self, pidslist=None, namepatn=None, username=None, treeroot=None, withroot=True):
+        selected, failures = {}, {}
+        candidat = None
+        if pidslist or treeroot is not None:
+            candidat = {}
+            for prociden in pidslist or []:
+                try:
+                    candidat[prociden] = psutil.Process(prociden)
+                except psutil.Error as expt:
+                    failures[prociden] = self.describe_error(expt)
+            if treeroot is not None:
+                try:
+                    rootproc = psutil.Process(treeroot)
+                    if withroot:
+                        candidat[rootproc.pid] = rootproc
+                    for proc in rootproc.children(recursive=True):
+                        candidat[proc.pid] = proc
+                except psutil.Error as expt:
+                    failures[treeroot] = self.describe_error(expt)
+            candidat = candidat.values()
+        elif namepatn or username:
+            candidat = psutil.process_iter()
+        else:
+            # Refuse to act on every process when no selector was given
+            return selected, failures
+        for proc in candidat:
+            try:
+                if namepatn and not fnmatch.fnmatchcase(proc.name(), namepatn):
+                    continue
+                if username and proc.username() != username:
+                    continue
+            except psutil.Error as expt:
+                failures[proc.pid] = self.describe_error(expt)
+                continue
+            if proc.pid == os.getpid():
+                failures[proc.pid] = {"result": "skipped", "error": "DriverProcess", "errno": None}
+                continue
+            selected[proc.pid] = proc
+        return selected, failures
+
+    def dispatch(self, action, selected, failures, timeout=3.0):
+        results = dict(failures)
+        if action == "termkill":
+            # Ask politely first, then kill whatever is still around once the grace period ends
+            signaled = []
+            for prociden, proc in selected.items():
+                try:
+                    proc.terminate()
+                    signaled.append(proc)
+                except psutil.Error as expt:
+                    results[prociden] = self.describe_error(expt)
+            gonelist, alivlist = psutil.wait_procs(signaled, timeout=timeout)
+            for proc in gonelist:
+                results[proc.pid] = {"result": "terminated", "error": None, "errno": None}
+            for proc in alivlist:
+                try:
+                    proc.kill()
+                    results[proc.pid] = {"result": "killed", "error": None, "errno": None}
+                except psutil.NoSuchProcess:
+                    results[proc.pid] = {"result": "terminated", "error": None, "errno": None}
+                except psutil.Error as expt:
+                    results[proc.pid] = self.describe_error(expt)
+            psutil.wait_procs(alivlist, timeout=timeout)
+        else:
+            methname = PROCESS_ACTIONS[action]
+            for prociden, proc in selected.items():
+                try:
+                    getattr(proc, methname)()
+                    results[prociden] = {"result": "done", "error": None, "errno": None}
+                except psutil.Error as expt:
+                    results[prociden] = self.describe_error(expt)
+        retndata = {
+            "action": action,
+            "results": results,
+            "summary": {
+                "selected": len(selected),
+                "failed": sum(1 for indx in results.values() if indx["result"] in ("failed", "skipped")),
+            },
+        }
+        return retndata
+
+
+class ProcessTable:
+    def __init__(self):
+        self.entries = {}
+
+    def create_entry(self, prociden, procname, username, createtm, nowtimes):
+        entry = {
+            "name": procname,
+            "username": username,
+            "create_time": createtm,
+            # New processes are measured against their lifetime instead of reading 0.0
+            "lastcpus": 0.0,
+            "lasttime": nowtimes - max(time.time() - createtm, 0.0),
+        }
+        self.entries[prociden] = entry
+        return entry
+
+    def sample_entry(self, prociden, entry, cpustime, memprcnt, nowtimes, parentid=None, rssbytes=None):
+        duration = nowtimes - entry["lasttime"]
+        cpuprcnt = round(max(cpustime - entry["lastcpus"], 0.0) / duration * 100, 1) if duration > 0 else 0.0
+        entry["lastcpus"] = cpustime
+        entry["lasttime"] = nowtimes
+        singlist = {
+            "pid": prociden,
+            "name": entry["name"],
+            "username": entry["username"],
+            "memory_percent": memprcnt,
+            "cpu_percent": cpuprcnt,
+            "ppid": parentid,
+            "rss": rssbytes,
+        }
+        return singlist
+
+    def refresh_entry(self, proc, nowtimes):
+        entry = self.entries.get(proc.pid)
+        with proc.oneshot():
+            # process_iter hands out a fresh handle when a PID is reused, which changes create_time
+            if entry is None or entry["create_time"] != proc.create_time():
+                try:
+                    username = proc.username()
+                except (psutil.AccessDenied, KeyError):
+                    username = None
+                entry = self.create_entry(proc.pid, proc.name(), username, proc.create_time(), nowtimes)
+            cputimes = proc.cpu_times()
+            parentid = proc.ppid()
+            try:
+                rssbytes = proc.memory_info().rss
+                memprcnt = proc.memory_percent()
+            except psutil.AccessDenied:
+                rssbytes, memprcnt = None, None
+        return self.sample_entry(proc.pid, entry, cputimes.user + cputimes.system, memprcnt, nowtimes,
+                                 parentid, rssbytes)
+
+    def prune_entries(self, retndata):
+        for indx in [indx for indx in self.entries if indx not in retndata]:
+            del self.entries[indx]
+
+    def return_listing(self):
+        nowtimes = time.monotonic()
+        retndata = {}
+        for proc in psutil.process_iter():
+            try:
+                retndata[proc.pid] = self.refresh_entry(proc, nowtimes)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        self.prune_entries(retndata)
+        return retndata
+
+
+PROC_STATUSES = {
+    "R": "running",
+    "S": "sleeping",
+    "D": "disk-sleep",
+    "T": "stopped",
+    "t": "tracing-stop",
+    "Z": "zombie",
+    "X": "dead",
+    "x": "dead",
+    "K": "wake-kill",
+    "W": "waking",
+    "I": "idle",
+    "P": "parked",
+}
+
+ProcfsIdentity = namedtuple("ProcfsIdentity", ["real", "effective", "saved"])
+ProcfsSwitches = namedtuple("ProcfsSwitches", ["voluntary", "involuntary"])
+ProcfsCpuTimes = namedtuple("ProcfsCpuTimes", ["user", "system", "children_user", "children_system", "iowait"])
+ProcfsMemoryInfo = namedtuple("ProcfsMemoryInfo", ["rss", "vms", "shared", "text", "lib", "data", "dirty"])
+
+
+class ProcfsReader:
+    def __init__(self, procpath=None):
+        # Follows psutil by default, so both backends read the same procfs root
+        self.procpath = procpath or psutil.PROCFS_PATH
+        self.clockhtz = os.sysconf("SC_CLK_TCK")
+        self.pagesize = os.sysconf("SC_PAGE_SIZE")
+        self.boottime = psutil.boot_time()
+        self.memtotal = psutil.virtual_memory().total
+        self.readbuff = bytearray(8192)
+        self.username = {}
+
+    def read_file(self, prociden, filename):
+        filedesc = os.open("%s/%d/%s" % (self.procpath, prociden, filename), os.O_RDONLY)
+        try:
+            # Small /proc files fit the shared buffer, larger ones are read whole
+            readsize = os.readv(filedesc, [self.readbuff])
+            if readsize < len(self.readbuff):
+                return bytes(self.readbuff[:readsize])
+            chunks = [bytes(self.readbuff)]
+            while True:
+                partdata = os.read(filedesc, 65536)
+                if not partdata:
+                    return b"".join(chunks)
+                chunks.append(partdata)
+        finally:
+            os.close(filedesc)
+
+    def list_pids(self):
+        return sorted(int(indx) for indx in os.listdir(self.procpath) if indx.isdigit())
+
+    def read_stat(self, prociden):
+        filedata = self.read_file(prociden, "stat")
+        rparindx = filedata.rindex(b")")
+        statfils = filedata[rparindx + 2:].split()
+        statfils.insert(0, filedata[filedata.index(b"(") + 1:rparindx])
+        return statfils
+
+    def read_statm(self, prociden):
+        return [int(indx) * self.pagesize for indx in self.read_file(prociden, "statm").split()[:7]]
+
+    def read_status(self, prociden):
+        retndata = {}
+        for indx in self.read_file(prociden, "status").splitlines():
+            keyvalue = indx.split(b":", 1)
+            if len(keyvalue) == 2:
+                retndata[keyvalue[0]] = keyvalue[1].split()
+        return retndata
+
+    def read_cmdline(self, prociden):
+        filedata = os.fsdecode(self.read_file(prociden, "cmdline"))
+        separatr = "\x00" if "\x00" in filedata else " "
+        if filedata.endswith(separatr):
+            filedata = filedata[:-1]
+        return filedata.split(separatr) if filedata else []
+
+    def lookup_username(self, useriden):
+        if useriden not in self.username:
+            try:
+                self.username[useriden] = pwd.getpwuid(useriden).pw_name
+            except KeyError:
+                self.username[useriden] = str(useriden)
+        return self.username[useriden]
+
+    def process_name(self, prociden, statfils):
+        procname = os.fsdecode(statfils[0])
+        # The kernel truncates comm to 15 characters, psutil recovers the full name from cmdline
+        if len(procname) >= 15:
+            try:
+                cmdlines = self.read_cmdline(prociden)
+            except PermissionError:
+                cmdlines = []
+            if cmdlines and os.path.basename(cmdlines[0]).startswith(procname):
+                procname = os.path.basename(cmdlines[0])
+        return procname
+
+    def create_time(self, statfils):
+        return (int(statfils[20]) / self.clockhtz) + self.boottime
+
+    def cpu_seconds(self, statfils):
+        return (int(statfils[12]) + int(statfils[13])) / self.clockhtz
+
+    def terminal_map(self):
+        retndata = {}
+        for indx in glob.glob("/dev/tty*") + glob.glob("/dev/pts/*"):
+            try:
+                retndata[os.stat(indx).st_rdev] = indx
+            except OSError:
+                pass
+        return retndata
+
+    def return_process_dict(self, prociden):
+        statfils = self.read_stat(prociden)
+        statmems = self.read_statm(prociden)
+        statuses = self.read_status(prociden)
+        uidsdata = [int(indx) for indx in statuses[b"Uid"][:3]]
+        gidsdata = [int(indx) for indx in statuses[b"Gid"][:3]]
+        procstmp = {
+            "pid": prociden,
+            "username": self.lookup_username(uidsdata[0]),
+            "uids": ProcfsIdentity(*uidsdata),
+            "memory_percent": statmems[1] / self.memtotal * 100,
+            "name": self.process_name(prociden, statfils),
+            "create_time": self.create_time(statfils),
+            "num_ctx_switches": ProcfsSwitches(
+                int(statuses[b"voluntary_ctxt_switches"][0]),
+                int(statuses[b"nonvoluntary_ctxt_switches"][0]),
+            ),
+            # A handle that was never sampled before reports 0.0, as psutil does
+            "cpu_percent": 0.0,
+            "cpu_times": ProcfsCpuTimes(
+                int(statfils[12]) / self.clockhtz,
+                int(statfils[13]) / self.clockhtz,
+                int(statfils[14]) / self.clockhtz,
+                int(statfils[15]) / self.clockhtz,
+                int(statfils[40]) / self.clockhtz,
+            ),
+            "memory_info": ProcfsMemoryInfo(
+                statmems[1], statmems[0], statmems[2], statmems[3], statmems[4], statmems[5], statmems[6]
+            ),
+            "status": PROC_STATUSES.get(statfils[1].decode(), "?"),
+            "num_threads": int(statfils[18]),
+            "gids": ProcfsIdentity(*gidsdata),
+            "terminal": self.terminal_map().get(int(statfils[5])),
+        }
+        return procstmp
+
+
+class ProcfsProcessTable(ProcessTable):
+    def __init__(self, procpath=None):
+        super().__init__()
+        self.reader = ProcfsReader(procpath)
+
+    def refresh_entry(self, prociden, nowtimes):
+        reader = self.reader
+        statfils = reader.read_stat(prociden)
+        entry = self.entries.get(prociden)
+        createtm = reader.create_time(statfils)
+        if entry is None or entry["create_time"] != createtm:
+            try:
+                username = reader.lookup_username(int(reader.read_status(prociden)[b"Uid"][0]))
+            except PermissionError:
+                username = None
+            entry = self.create_entry(prociden, reader.process_name(prociden, statfils), username, createtm, nowtimes)
+        try:
+            rssbytes = reader.read_statm(prociden)[1]
+            memprcnt = rssbytes / reader.memtotal * 100
+        except PermissionError:
+            rssbytes, memprcnt = None, None
+        return self.sample_entry(prociden, entry, reader.cpu_seconds(statfils), memprcnt, nowtimes,
+                                 int(statfils[2]), rssbytes)
+
+    def return_listing(self):
+        nowtimes = time.monotonic()
+        retndata = {}
+        for prociden in self.reader.list_pids():
+            try:
+                retndata[prociden] = self.refresh_entry(prociden, nowtimes)
+            except (FileNotFoundError, ProcessLookupError, PermissionError, ValueError, IndexError, KeyError):
+                # The process exited mid-read or left a truncated file behind
+                pass
+        self.prune_entries(retndata)
+        return retndata
+
+
+def return_process_table(procback="psutil"):
+    if procback == "procfs":
+        return ProcfsProcessTable()
+    return ProcessTable()
+
+
+class CounterRates:
+    def __init__(self):
+        self.prevdata = {}
+
+    def counter_delta(self, prevvalu, currvalu):
+        if currvalu >= prevvalu:
+            return currvalu - prevvalu
+        # psutil already unwraps disk and network counters and the rest are 64-bit, so going backwards
+        # means a reset, a re-added device or a recreated cgroup, and the new reading is the next baseline
+        return 0
+
+    def attach_rates(self, sectname, retndata, ratemaps, timestmp=None):
+        timestmp = time.monotonic() if timestmp is None else timestmp
+        prevsect = self.prevdata.get(sectname, {})
+        currsect = {}
+        for devcname, singlist in retndata.items():
+            prevcntr = prevsect.get(devcname)
+            currsect[devcname] = (timestmp, {indx: singlist[indx] for indx in ratemaps})
+            for indx, ratename in ratemaps.items():
+                # Devices seen for the first time, including hot-plugged ones, start at zero
+                if prevcntr is None or timestmp <= prevcntr[0]:
+                    singlist[ratename] = 0.0
+                else:
+                    deltaval = self.counter_delta(prevcntr[1][indx], singlist[indx])
+                    singlist[ratename] = round(deltaval / (timestmp - prevcntr[0]), 2)
+        # Replacing the section wholesale forgets devices that went away
+        self.prevdata[sectname] = currsect
+        return retndata
+
+    def forget(self, sectname, devclist):
+        prevsect = self.prevdata.get(sectname, {})
+        for devcname in devclist:
+            prevsect.pop(devcname, None)
+
+
+# Each level nests two JSON containers and orjson refuses more than 255, deeper nodes are reached with root
+MAXIMUM_TREE_DEPTH = 100
+
+
+class ProcessTree:
+    def __init__(self, procinfo):
+        self.procinfo = procinfo
+        self.children = {}
+        self.rootlist = []
+        for prociden, singlist in procinfo.items():
+            parentid = singlist.get("ppid")
+            if parentid in procinfo and parentid != prociden:
+                self.children.setdefault(parentid, []).append(prociden)
+            else:
+                self.rootlist.append(prociden)
+        self.subtotal = {}
+        # Walk the forest once in preorder, then fold the totals up from the leaves
+        ordering, stacklist = [], list(self.rootlist)
+        while stacklist:
+            prociden = stacklist.pop()
+            if prociden in self.subtotal:
+                continue
+            self.subtotal[prociden] = None
+            ordering.append(prociden)
+            stacklist.extend(self.children.get(prociden, []))
+        for prociden in reversed(ordering):
+            singlist = procinfo[prociden]
+            cpuprcnt, rssbytes = singlist["cpu_percent"] or 0.0, singlist.get("rss") or 0
+            for chldiden in self.children.get(prociden, []):
+                if self.subtotal.get(chldiden) is not None:
+                    cpuprcnt += self.subtotal[chldiden][0]
+                    rssbytes += self.subtotal[chldiden][1]
+            self.subtotal[prociden] = (cpuprcnt, rssbytes)
+
+    def render_node(self, prociden, depth=None):
+        # Deep chains are rendered off an explicit stack, recursion would hit the interpreter limit
+        rootlist, visited = [], set()
+        stacklist = [(prociden, depth, rootlist)]
+        while stacklist:
+            prociden, depth, siblings = stacklist.pop()
+            if prociden in visited:
+                continue
+            visited.add(prociden)
+            singlist = self.procinfo[prociden]
+            subtotal = self.subtotal.get(prociden) or (0.0, 0)
+            retndata = {
+                "pid": prociden,
+                "name": singlist["name"],
+                "username": singlist["username"],
+                "cpu_percent": singlist["cpu_percent"],
+                "rss": singlist.get("rss"),
+                "subtree_cpu_percent": round(subtotal[0], 1),
+                "subtree_rss": subtotal[1],
+                "children": [],
+            }
+            siblings.append(retndata)
+            if depth is None or depth > 0:
+                chldlist = sorted(self.children.get(prociden, []),
+                                  key=lambda indx: -(self.subtotal.get(indx) or (0.0, 0))[1])
+                # Pushed in reverse so that the children pop off in their sorted order
+                for chldiden in reversed(chldlist):
+                    stacklist.append((chldiden, None if depth is None else depth - 1, retndata["children"]))
+        return rootlist[0]
+
+    def return_tree(self, rootiden=None, depth=None):
+        depth = MAXIMUM_TREE_DEPTH if depth is None else min(depth, MAXIMUM_TREE_DEPTH)
+        if rootiden is None:
+            return {"forest": [self.render_node(indx, depth) for indx in sorted(self.rootlist)]}
+        if rootiden not in self.procinfo:
+            return {"forest": [], "retnmesg": "nosuchprocess"}
+        return {"forest": [self.render_node(rootiden, depth)]}
+
+
+PROCESS_SORT_KEYS = ("pid", "name", "username", "memory_percent", "cpu_percent")
+
+
+def process_sort_value(sortkey):
+    if sortkey in ("name", "username"):
+        return lambda singlist: (singlist[sortkey] or "").lower()
+    # Rows the driver was denied access to carry None and sort below every real value
+    return lambda singlist: float("-inf") if singlist[sortkey] is None else singlist[sortkey]
+
+
+def select_process_listing(procinfo, sortkey="cpu_percent", descend=True, limit=None, offset=0,
+                           namefilt=None, userfilt=None, mincpu=None, minmem=None):
+    if sortkey not in PROCESS_SORT_KEYS:
+        sortkey = "cpu_percent"
+    namefilt = namefilt.lower() if namefilt else None
+    userfilt = userfilt.lower() if userfilt else None
+    matching = []
+    for singlist in procinfo.values():
+        if namefilt and namefilt not in (singlist["name"] or "").lower():
+            continue
+        if userfilt and userfilt not in (singlist["username"] or "").lower():
+            continue
+        if mincpu is not None and (singlist["cpu_percent"] or 0.0) < mincpu:
+            continue
+        if minmem is not None and (singlist["memory_percent"] or 0.0) < minmem:
+            continue
+        matching.append(singlist)
+    offset = max(offset or 0, 0)
+    sortfunc = process_sort_value(sortkey)
+    if limit is None:
+        selected = sorted(matching, key=sortfunc, reverse=descend)[offset:]
+    else:
+        # Partial selection keeps the work at O(n log k) for the k rows actually sent
+        pickfunc = heapq.nlargest if descend else heapq.nsmallest
+        selected = pickfunc(offset + max(limit, 0), matching, key=sortfunc)[offset:]
+    retndata = {
+        "total": len(matching),
+        "offset": offset,
+        "limit": limit,
+        "sortkey": sortkey,
+        "descend": descend,
+        "procinfo": selected,
+    }
+    return retndata
+
+
+def read_sysfs_value(filepath):
+    with open(filepath, "r") as fileobjc:
+        return fileobjc.read().strip()
+
+
+def read_sysfs_number(filepath, scale=1):
+    try:
+        return float(read_sysfs_value(filepath)) / scale
+    except (OSError, ValueError):
+        return None
+
+
+def read_sysfs_label(filepath):
+    try:
+        return read_sysfs_value(filepath)
+    except OSError:
+        return ""
+
+
+def read_hwmon_chip(hwmnpath):
+    # Mirrors what psutil reads for one chip, so a stalled chip only holds up its own source
+    chipname = read_sysfs_value(os.path.join(hwmnpath, "name"))
+    temps, fans = [], []
+    inptlist = glob.glob(os.path.join(hwmnpath, "temp*_input")) + \
+        glob.glob(os.path.join(hwmnpath, "device", "temp*_input"))
+    for inptpath in sorted(inptlist):
+        basepath = inptpath[:-len("_input")]
+        current = read_sysfs_number(inptpath, 1000)
+        if current is None:
+            continue
+        high = read_sysfs_number(basepath + "_max", 1000)
+        critical = read_sysfs_number(basepath + "_crit", 1000)
+        singdict = {
+            "label": read_sysfs_label(basepath + "_label"),
+            "current": current,
+            "high": high if high is not None else critical,
+            "critical": critical if critical is not None else high,
+        }
+        temps.append(singdict)
+    for inptpath in sorted(glob.glob(os.path.join(hwmnpath, "fan*_input"))):
+        current = read_sysfs_number(inptpath)
+        if current is None:
+            continue
+        fans.append({"label": read_sysfs_label(inptpath[:-len("_input")] + "_label"), "current": int(current)})
+    return {"senstemp": {chipname: temps} if temps else {}, "fanspeed": {chipname: fans} if fans else {}}
+
+
+def read_thermal_zone(zonepath):
+    chipname = read_sysfs_value(os.path.join(zonepath, "type"))
+    current = read_sysfs_number(os.path.join(zonepath, "temp"), 1000)
+    if current is None:
+        return {"senstemp": {}, "fanspeed": {}}
+    high, critical = None, None
+    for typepath in glob.glob(os.path.join(zonepath, "trip_point_*_type")):
+        triptype = read_sysfs_label(typepath)
+        if triptype == "critical":
+            critical = read_sysfs_number(typepath[:-len("_type")] + "_temp", 1000)
+        elif triptype == "high":
+            high = read_sysfs_number(typepath[:-len("_type")] + "_temp", 1000)
+    singdict = {"label": "", "current": current, "high": high, "critical": critical}
+    return {"senstemp": {chipname: [singdict]}, "fanspeed": {}}
+
+
+def read_psutil_temperatures():
+    retndata = {}
+    for chipname, readings in psutil.sensors_temperatures(fahrenheit=False).items():
+        retndata[chipname] = [
+            {"label": indx.label, "current": indx.current, "high": indx.high, "critical": indx.critical}
+            for indx in readings
+        ]
+    return {"senstemp": retndata, "fanspeed": {}}
+
+
+def read_psutil_fans():
+    retndata = {}
+    for chipname, readings in psutil.sensors_fans().items():
+        retndata[chipname] = [{"label": indx.label, "current": indx.current} for indx in readings]
+    return {"senstemp": {}, "fanspeed": retndata}
+
+
+def read_psutil_battery():
+    battstat = psutil.sensors_battery()
+    if battstat is None:
+        return None
+    retndata = {
+        "percent": battstat.percent,
+        "secsleft": battstat.secsleft,
+        "power_plugged": battstat.power_plugged,
+    }
+    return retndata
+
+
+class SensorSource:
+    def __init__(self, name, readfunc, timeout=0.5, backbase=10.0, backmax=300.0):
+        self.name = name
+        self.readfunc = readfunc
+        self.timeout = timeout
+        self.backbase = backbase
+        self.backmax = backmax
+        self.value = None
+        self.updated = None
+        self.duration = None
+        self.failures = 0
+        self.lasterror = None
+        self.retrytim = 0.0
+        self.future = None
+        self.strttime = None
+        self.timedout = False
+
+    def record_failure(self, errtext):
+        self.failures += 1
+        self.lasterror = errtext
+        self.retrytim = time.monotonic() + min(self.backbase * 2 ** (self.failures - 1), self.backmax)
+
+    def complete(self, future):
+        self.duration = time.monotonic() - self.strttime
+        try:
+            value = future.result()
+        except Exception as expt:
+            self.record_failure("%s: %s" % (type(expt).__name__, expt))
+            return
+        # A read that overran its timeout still returns good data, but the source stays backed off
+        self.value, self.updated = value, time.time()
+        if self.timedout or self.duration > self.timeout:
+            if not self.timedout:
+                self.record_failure("Read took %.0fms" % (self.duration * 1000))
+            return
+        self.failures, self.lasterror = 0, None
+
+    def submit(self, executor):
+        nowtimes = time.monotonic()
+        if self.future is not None and not self.future.done():
+            # Sysfs reads cannot be interrupted, a hung one is only marked and left to finish on its own
+            if not self.timedout and nowtimes - self.strttime > self.timeout:
+                self.timedout = True
+                self.record_failure("Read exceeded %.0fms" % (self.timeout * 1000))
+            return None
+        if nowtimes < self.retrytim:
+            return None
+        self.strttime, self.timedout = nowtimes, False
+        self.future = executor.submit(self.readfunc)
+        self.future.add_done_callback(self.complete)
+        return self.future
+
+    def return_status(self, staletime):
+        retndata = {
+            "updated": self.updated,
+            "stale": self.updated is None or time.time() - self.updated > staletime,
+            "failures": self.failures,
+            "error": self.lasterror,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+        }
+        return retndata
+
+
+class SensorCollector:
+    def __init__(self, timeout=0.5, staletime=30.0, sysfpath="/sys"):
+        self.timeout = timeout
+        self.staletime = staletime
+        self.sysfpath = sysfpath
+        self.sources = self.discover_sources()
+        self.executor = ThreadPoolExecutor(max_workers=max(len(self.sources), 1), thread_name_prefix="sensors")
+
+    def discover_sources(self):
+        sources = []
+        hwmnlist = sorted(glob.glob(os.path.join(self.sysfpath, "class", "hwmon", "hwmon*")))
+        if hwmnlist:
+            hwmntemp = False
+            for indx in hwmnlist:
+                sources.append(SensorSource(os.path.basename(indx), functools.partial(read_hwmon_chip, indx),
+                                            self.timeout))
+                hwmntemp = hwmntemp or bool(glob.glob(os.path.join(indx, "temp*_input")) or
+                                            glob.glob(os.path.join(indx, "device", "temp*_input")))
+            # Like psutil, thermal zones are only read when hwmon has no temperatures of its own,
+            # otherwise a Pi would report its SoC twice as cpu_thermal and cpu-thermal
+            if not hwmntemp:
+                for indx in sorted(glob.glob(os.path.join(self.sysfpath, "class", "thermal", "thermal_zone*"))):
+                    sources.append(SensorSource(os.path.basename(indx), functools.partial(read_thermal_zone, indx),
+                                                self.timeout))
+        else:
+            if hasattr(psutil, "sensors_temperatures"):
+                sources.append(SensorSource("temperatures", read_psutil_temperatures, self.timeout))
+            if hasattr(psutil, "sensors_fans"):
+                sources.append(SensorSource("fans", read_psutil_fans, self.timeout))
+        if hasattr(psutil, "sensors_battery"):
+            sources.append(SensorSource("battery", read_psutil_battery, self.timeout))
+        return sources
+
+    def refresh(self):
+        pending = [indx.submit(self.executor) for indx in self.sources]
+        # Only sources that have never answered are waited on, and never past the timeout
+        firstrun = [indx.future for indx, future in zip(self.sources, pending)
+                    if future is not None and indx.updated is None]
+        if firstrun:
+            wait(firstrun, self.timeout)
+
+    def return_section(self, sectname):
+        retndata, seenlist = {}, set()
+        for indx in self.sources:
+            if indx.name == "battery" or indx.value is None:
+                continue
+            # Chips sharing a name, like two nvme drives, keep apart under their hwmon name, merged they repeat labels
+            for chipname, readings in indx.value[sectname].items():
+                retndata["%s_%s" % (chipname, indx.name) if chipname in seenlist else chipname] = readings
+            seenlist.update(indx.value["senstemp"], indx.value["fanspeed"])
+        return retndata
+
+    def return_battery(self):
+        for indx in self.sources:
+            if indx.name == "battery" and indx.value is not None:
+                return indx.value
+        return None
+
+    def return_status(self):
+        return {indx.name: indx.return_status(self.staletime) for indx in self.sources}
+
+
 class LiveUpdatingElements:
+    def __init__(self, procback="psutil"):
+        self.procback = procback
+
+    # Collector state is built on first use, so /deadsync never pays for sensor workers or a cgroup walk it skips
+
+    @functools.cached_property
+    def proctabl(self):
+        return return_process_table(self.procback)
+
+    @functools.cached_property
+    def cntrrate(self):
+        return CounterRates()
+
+    @functools.cached_property
+    def sensors(self):
+        return SensorCollector()
+
+    @functools.cached_property
+    def cgroups(self):
+        return CgroupCollector()
+
     def get_virtual_memory_data(self):
         bruhdata = psutil.virtual_memory()
         retndata = {
@@ -140,6 +927,7 @@ class LiveUpdatingElements:
             "sin": swapinfo.sin,
             "sout": swapinfo.sout,
         }
+        self.cntrrate.attach_rates("swapinfo", {"swap": retndata}, {"sin": "sin_rate", "sout": "sout_rate"})
         return retndata
 
     def get_cpu_state_times(self):
@@ -177,6 +965,13 @@ class LiveUpdatingElements:
             "soft_interrupts": cpustats.soft_interrupts,
             "syscalls": cpustats.syscalls,
         }
+        ratemaps = {
+            "ctx_switches": "ctx_switches_rate",
+            "interrupts": "interrupts_rate",
+            "soft_interrupts": "soft_interrupts_rate",
+            "syscalls": "syscalls_rate",
+        }
+        self.cntrrate.attach_rates("cpustats", {"cpu": retndata}, ratemaps)
         return retndata
 
     def get_cpu_clock_speed(self):
@@ -208,6 +1003,33 @@ class LiveUpdatingElements:
                 "busy_time": getattr(disk, 'busy_time', 0),
             }
             retndata[indx] = singlist
+        ratemaps = {
+            "read_bytes": "read_bytes_rate",
+            "write_bytes": "write_bytes_rate",
+            "read_count": "read_iops",
+            "write_count": "write_iops",
+            "busy_time": "busy_percent",
+        }
+        self.cntrrate.attach_rates("diousage", retndata, ratemaps)
+        for singlist in retndata.values():
+            # busy_time counts milliseconds, so its per-second rate over ten is the utilisation
+            singlist["busy_percent"] = round(min(singlist["busy_percent"] / 10, 100.0), 2)
+        return retndata
+
+    def get_disk_space_usage(self):
+        retndata = {}
+        for indx in psutil.disk_partitions(all=False):
+            try:
+                diskused = psutil.disk_usage(indx.mountpoint)
+            except OSError:
+                continue
+            singlist = {
+                "total": diskused.total,
+                "used": diskused.used,
+                "free": diskused.free,
+                "percent": diskused.percent,
+            }
+            retndata[indx.mountpoint] = singlist
         return retndata
 
     def get_network_io_usage(self):
@@ -225,98 +1047,418 @@ class LiveUpdatingElements:
                 "dropout": netusage[indx].dropout,
             }
             retndata[indx] = singlist
+        ratemaps = {
+            "bytes_sent": "bytes_sent_rate",
+            "bytes_recv": "bytes_recv_rate",
+            "packets_sent": "packets_sent_rate",
+            "packets_recv": "packets_recv_rate",
+        }
+        self.cntrrate.attach_rates("netusage", retndata, ratemaps)
         return retndata
 
     def get_process_listing_info(self):
-        procstmp = psutil.process_iter(["pid", "name", "username", "memory_percent", "cpu_percent"])
-        retndata = {}
-        for indx in procstmp:
-            singlist = {
-                "pid": indx.info["pid"],
-                "name": indx.info["name"],
-                "username": indx.info["username"],
-                "memory_percent": indx.info["memory_percent"],
-                "cpu_percent": indx.info["cpu_percent"],
-            }
-            retndata[indx.info["pid"]] = singlist
+        return self.proctabl.return_listing()
+
+    def get_cgroup_usage(self):
+        retndata = self.cgroups.collect()
+        # Recreated cgroups start from a fresh baseline instead of a delta against their predecessor
+        self.cntrrate.forget("cgrpinfo", self.cgroups.recreated)
+        self.cntrrate.attach_rates("cgrpinfo", retndata, CGROUP_RATE_MAPS)
+        for singlist in retndata.values():
+            # Microsecond counters advance a million per second for each fully busy CPU
+            singlist["cpu_percent"] = round(singlist["cpu_percent"] / 10000, 2)
+            singlist["throttled_percent"] = round(singlist["throttled_percent"] / 10000, 2)
         return retndata
 
     def get_sensors_temperature(self):
-        retndata = {}
-        if not hasattr(psutil, 'sensors_temperatures'):
-            return retndata
-        try:
-            senstemp = psutil.sensors_temperatures(fahrenheit=False)
-            for indx in senstemp.keys():
-                retndata[indx] = []
-                for jndx in senstemp[indx]:
-                    singdict = {
-                        "label": jndx.label,
-                        "current": str(jndx.current),
-                        "high": str(jndx.high),
-                        "critical": str(jndx.critical),
-                    }
-                    retndata[indx].append(singdict)
-        except:
-            pass
-        return retndata
+        return self.sensors.return_section("senstemp")
 
     def get_sensors_fan_speed(self):
-        retndata = {}
-        if not hasattr(psutil, 'sensors_fans'):
-            return retndata
-        try:
-            senstemp = psutil.sensors_fans()
-            for indx in senstemp.keys():
-                retndata[indx] = []
-                for jndx in senstemp[indx]:
-                    singdict = {
-                        "label": jndx.label,
-                        "current": jndx.current
-                    }
-                    retndata[indx].append(singdict)
-        except:
-            pass
-        return retndata
+        return self.sensors.return_section("fanspeed")
 
     def get_sensors_battery_status(self):
-        retndata = {}
-        try:
-            battstat = psutil.sensors_battery()
-            retndata = {
-                "percent": battstat.percent,
-                "secsleft": battstat.secsleft,
-                "power_plugged": battstat.power_plugged,
-            }
-        except:
-            retndata = {
+        battstat = self.sensors.return_battery()
+        if battstat is None:
+            battstat = {
                 "percent": 0,
                 "secsleft": 0,
                 "power_plugged": True,
             }
+        return battstat
+
+    def get_sensors_reading(self):
+        # Reads run on the sensor workers, this only picks up their last good values
+        self.sensors.refresh()
+        retndata = {
+            "senstemp": self.get_sensors_temperature(),
+            "fanspeed": self.get_sensors_fan_speed(),
+            "battstat": self.get_sensors_battery_status(),
+            "sensstat": self.sensors.return_status(),
+        }
         return retndata
 
-    def return_live_data(self):
-        jsonobjc = {
-            "virtdata": self.get_virtual_memory_data(),
-            "swapinfo": self.get_swap_memory_info(),
-            "cpustats": self.get_cpu_statistics(),
-            "cputimes": self.get_cpu_state_times(),
-            "cpuprcnt": self.get_cpu_usage_percent(),
-            "cpuclock": self.get_cpu_clock_speed(),
-            "diousage": self.get_disk_io_usage(),
-            "netusage": self.get_network_io_usage(),
-            "procinfo": self.get_process_listing_info(),
-            "sensread": {
-                "senstemp": self.get_sensors_temperature(),
-                "fanspeed": self.get_sensors_fan_speed(),
-                "battstat": self.get_sensors_battery_status(),
-            }
+    def prime_baselines(self):
+        # cpu_percent and the counter rates compare against an earlier reading, take one now and discard it
+        psutil.cpu_percent(percpu=True)
+        self.get_cpu_statistics()
+        self.get_swap_memory_info()
+        self.get_disk_io_usage()
+        self.get_network_io_usage()
+        self.sensors.refresh()
+
+    def return_live_collectors(self):
+        collects = {
+            "virtdata": self.get_virtual_memory_data,
+            "swapinfo": self.get_swap_memory_info,
+            "cpustats": self.get_cpu_statistics,
+            "cputimes": self.get_cpu_state_times,
+            "cpuprcnt": self.get_cpu_usage_percent,
+            "cpuclock": self.get_cpu_clock_speed,
+            "diousage": self.get_disk_io_usage,
+            "diskused": self.get_disk_space_usage,
+            "netusage": self.get_network_io_usage,
+            "procinfo": self.get_process_listing_info,
+            "sensread": self.get_sensors_reading,
+        }
+        return collects
+
+    def return_optional_collectors(self):
+        # Served only when a client names them in fields, they never weigh on the default payload
+        collects = {
+            "cgrpinfo": self.get_cgroup_usage,
         }
+        return collects
+
+    def return_live_data(self):
+        jsonobjc = {}
+        for indx, collfunc in self.return_live_collectors().items():
+            jsonobjc[indx] = collfunc()
         return jsonobjc
 
 
+LiveSnapshot = namedtuple("LiveSnapshot", ["seqnumbr", "timestmp", "jsonobjc"])
+
+
+def format_sequence_token(epoch, seqnumbr):
+    return "%s-%d" % (epoch, seqnumbr)
+
+
+def parse_sequence_token(tokntext):
+    # A bare number carries no epoch, so it never resumes against the current run
+    epoch, _, seqtext = (tokntext or "").rpartition("-")
+    if not seqtext.isdigit():
+        return None, None
+    return epoch or None, int(seqtext)
+
+
+# Seconds between the discarded baseline reading and the first published snapshot
+PRIMING_DELAY = 0.25
+
+# Seconds an optional section keeps being sampled after the last request that named it
+OPTIONAL_IDLE = 60.0
+
+# Refresh interval in seconds for each /livesync section, sections missing here follow the sampler interval
+SECTION_CADENCE = {
+    "virtdata": 1.0,
+    "swapinfo": 1.0,
+    "cpustats": 1.0,
+    "cputimes": 1.0,
+    "cpuprcnt": 1.0,
+    "cpuclock": 5.0,
+    "diousage": 1.0,
+    "diskused": 30.0,
+    "netusage": 1.0,
+    "procinfo": 5.0,
+    "sensread": 10.0,
+}
+
+
+def compute_section_delta(basedata, currdata):
+    added, changed, removed = {}, {}, []
+    for indx, elemobjc in currdata.items():
+        if indx not in basedata:
+            added[indx] = elemobjc
+        elif basedata[indx] is not elemobjc and basedata[indx] != elemobjc:
+            changed[indx] = elemobjc
+    for indx in basedata.keys():
+        if indx not in currdata:
+            removed.append(str(indx))
+    return added, changed, removed
+
+
+class LiveSampler:
+    def __init__(self, interval=1.0, cadence=None, histsize=30, procback="psutil", selfstat=None):
+        self.interval = interval
+        self.cadence = dict(SECTION_CADENCE)
+        if cadence:
+            self.cadence.update(cadence)
+        self.elements = LiveUpdatingElements(procback)
+        if selfstat is not None:
+            selfstat.instrument(self.elements)
+        self.collects = self.elements.return_live_collectors()
+        self.optlock = threading.Lock()
+        self.optional = {indx: self.locked_collector(collfunc)
+                         for indx, collfunc in self.elements.return_optional_collectors().items()}
+        self.demanded = {}
+        self.lastseen = {}
+        self.snapshot = None
+        self.history = deque(maxlen=histsize)
+        self.deltcach = {}
+        self.consumer = []
+        self.seqnumbr = 0
+        # Sequence numbers restart with every run, the epoch tells the runs apart
+        self.epoch = token_hex(4)
+        self.condtion = threading.Condition()
+        self.stopflag = threading.Event()
+        self.thrdobjc = None
+
+    def locked_collector(self, collfunc):
+        # Optional sections are also read from request threads, their counter baselines must not interleave
+        def collect():
+            with self.optlock:
+                return collfunc()
+        return collect
+
+    def demanded_collectors(self, nowtimes):
+        collects = dict(self.collects)
+        for indx, lasttime in list(self.demanded.items()):
+            if nowtimes - lasttime < OPTIONAL_IDLE:
+                collects[indx] = self.optional[indx]
+        return collects
+
+    def collect_sample(self):
+        nowtimes = time.monotonic()
+        prevdata = self.snapshot.jsonobjc if self.snapshot is not None else {}
+        jsonobjc = {}
+        for indx, collfunc in self.demanded_collectors(nowtimes).items():
+            # Half a tick of slack keeps a section from slipping a whole tick on timer jitter
+            duetimes = self.lastseen.get(indx, float("-inf")) + self.cadence.get(indx, self.interval)
+            if indx in prevdata and nowtimes < duetimes - self.interval / 2:
+                jsonobjc[indx] = prevdata[indx]
+            else:
+                try:
+                    jsonobjc[indx] = collfunc()
+                except Exception:
+                    # A failing collector keeps its last good section instead of losing the whole sample
+                    jsonobjc[indx] = prevdata.get(indx, {})
+                self.lastseen[indx] = nowtimes
+        with self.condtion:
+            self.seqnumbr += 1
+            # Published snapshots are never mutated, readers can share them freely
+            self.snapshot = LiveSnapshot(self.seqnumbr, time.time(), jsonobjc)
+            self.history.append(self.snapshot)
+            self.deltcach = {}
+            self.condtion.notify_all()
+        for consfunc in self.consumer:
+            try:
+                consfunc(self.snapshot)
+            except Exception:
+                pass
+        return self.snapshot
+
+    def add_consumer(self, consfunc):
+        self.consumer.append(consfunc)
+        return consfunc
+
+    def sampling_loop(self):
+        try:
+            self.elements.prime_baselines()
+        except Exception:
+            pass
+        # A short priming gap is enough for meaningful percentages without holding back the first snapshot
+        self.stopflag.wait(min(self.interval, PRIMING_DELAY))
+        while not self.stopflag.is_set():
+            strttime = time.monotonic()
+            try:
+                self.collect_sample()
+            except Exception:
+                pass
+            self.stopflag.wait(max(0.0, self.interval - (time.monotonic() - strttime)))
+
+    def start(self):
+        if self.thrdobjc is None:
+            self.thrdobjc = threading.Thread(target=self.sampling_loop, name="livesampler", daemon=True)
+            self.thrdobjc.start()
+        return self
+
+    def stop(self):
+        self.stopflag.set()
+        with self.condtion:
+            self.condtion.notify_all()
+        if self.thrdobjc is not None:
+            self.thrdobjc.join()
+            self.thrdobjc = None
+
+    def latest_snapshot(self, timeout=None):
+        with self.condtion:
+            if self.snapshot is None:
+                self.condtion.wait_for(lambda: self.snapshot is not None, timeout)
+            return self.snapshot
+
+    def wait_snapshot(self, seqnumbr, timeout=None):
+        with self.condtion:
+            self.condtion.wait_for(
+                lambda: self.stopflag.is_set() or (self.snapshot is not None and self.snapshot.seqnumbr > seqnumbr),
+                timeout
+            )
+            return self.snapshot
+
+    def return_live_data(self, sections=None, snapshot=None):
+        if snapshot is None:
+            snapshot = self.latest_snapshot()
+        if snapshot is None:
+            return {}
+        if sections is None:
+            return snapshot.jsonobjc
+        retndata = {indx: snapshot.jsonobjc[indx] for indx in sections if indx in snapshot.jsonobjc}
+        for indx in sections:
+            if indx not in self.optional:
+                continue
+            self.demanded[indx] = time.monotonic()
+            if indx not in retndata:
+                # The first request after an idle spell is answered directly, later samples carry the section
+                try:
+                    retndata[indx] = self.optional[indx]()
+                except Exception:
+                    retndata[indx] = {}
+        return retndata
+
+    def find_snapshot(self, seqnumbr):
+        for indx in reversed(self.history):
+            if indx.seqnumbr == seqnumbr:
+                return indx
+        return None
+
+    def return_delta_data(self, basenmbr, sections=None, baseepch=None, snapshot=None):
+        if snapshot is None:
+            snapshot = self.latest_snapshot()
+        if snapshot is None:
+            return {}
+        # A base from another run, or newer than anything published, is no base at all
+        if baseepch != self.epoch or basenmbr is None or basenmbr > snapshot.seqnumbr:
+            basenmbr = None
+        cachekey = (snapshot.seqnumbr, basenmbr, tuple(sections) if sections is not None else None)
+        deltcach = self.deltcach
+        if cachekey in deltcach:
+            return deltcach[cachekey]
+        basesnap = self.find_snapshot(basenmbr) if basenmbr is not None else None
+        # Both payloads come from the one snapshot read above, whatever the sampler publishes meanwhile
+        currdata = self.return_live_data(sections, snapshot)
+        if basesnap is None:
+            # Client is too far behind the retained history, resend everything
+            retndata = {
+                "epoch": self.epoch,
+                "seqnumbr": snapshot.seqnumbr,
+                "fullsync": True,
+                "jsonobjc": currdata,
+            }
+        else:
+            retndata = {
+                "epoch": self.epoch,
+                "seqnumbr": snapshot.seqnumbr,
+                "basenmbr": basenmbr,
+                "fullsync": False,
+                "added": {},
+                "changed": {},
+                "removed": {},
+            }
+            for indx, sectdata in currdata.items():
+                basedata = basesnap.jsonobjc.get(indx, {})
+                if basedata is sectdata:
+                    continue
+                added, changed, removed = compute_section_delta(basedata, sectdata)
+                if added:
+                    retndata["added"][indx] = added
+                if changed:
+                    retndata["changed"][indx] = changed
+                if removed:
+                    retndata["removed"][indx] = removed
+        deltcach[cachekey] = retndata
+        return retndata
+
+
+# rtnetlink multicast groups for link state and IPv4/IPv6 address changes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+
+
+class ChangeWatcher:
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self.lastload = None
+
+    def changed(self):
+        return self.lastload is None or time.monotonic() - self.lastload >= self.ttl
+
+    def loaded(self):
+        self.lastload = time.monotonic()
+
+
+class MountWatcher(ChangeWatcher):
+    def __init__(self, ttl=300.0, mntpath="/proc/self/mountinfo"):
+        super().__init__(ttl)
+        self.pollobjc = None
+        try:
+            self.fileobjc = open(mntpath, "rb")
+            self.pollobjc = select.poll()
+            # The kernel flags POLLPRI on this file whenever the mount table changes
+            self.pollobjc.register(self.fileobjc, select.POLLPRI | select.POLLERR)
+        except (OSError, AttributeError):
+            self.pollobjc = None
+
+    def changed(self):
+        if self.pollobjc is not None and self.pollobjc.poll(0):
+            return True
+        return super().changed()
+
+
+class LinkWatcher(ChangeWatcher):
+    def __init__(self, ttl=300.0):
+        super().__init__(ttl)
+        try:
+            self.sockobjc = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            self.sockobjc.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+            self.sockobjc.setblocking(False)
+        except (OSError, AttributeError):
+            self.sockobjc = None
+
+    def changed(self):
+        evntflag = False
+        while self.sockobjc is not None:
+            try:
+                self.sockobjc.recv(65536)
+                evntflag = True
+            except BlockingIOError:
+                break
+            except OSError:
+                # An overrun socket lost events, so assume something changed
+                evntflag = True
+                break
+        return evntflag or super().changed()
+
+
+# Sections that only change with the host configuration, the rest follow the live samples
+DEAD_STATIC_SECTIONS = frozenset(("osnmdata", "cpuquant", "diskpart", "netaddrs", "netstats", "boottime"))
+
+
 class DeadUpdatingElements(LiveUpdatingElements):
+    def __init__(self, procback="psutil", sampler=None, ttl=300.0):
+        super().__init__(procback)
+        self.sampler = sampler
+        self.factcach = {}
+        self.mntwatch = MountWatcher(ttl)
+        self.lnkwatch = LinkWatcher(ttl)
+        self.lockobjc = threading.Lock()
+
+    def memoize(self, factname, collfunc, watcher=None):
+        with self.lockobjc:
+            if factname not in self.factcach or (watcher is not None and watcher.changed()):
+                self.factcach[factname] = collfunc()
+                if watcher is not None:
+                    watcher.loaded()
+            return self.factcach[factname]
+
     def get_os_uname_data(self):
         unamdata = os.uname()
         retndata = {
@@ -376,22 +1518,40 @@ class DeadUpdatingElements(LiveUpdatingElements):
         boottime = time.ctime(psutil.boot_time())
         return boottime
 
-    def return_dead_data(self):
-        jsonobjc = {
-            "osnmdata": self.get_os_uname_data(),
-            "cpuquant": self.get_cpu_logical_count(),
-            "cpuclock": self.get_cpu_clock_speed(),
-            "diskpart": self.get_all_disk_partitions(),
-            "diousage": self.get_disk_io_usage(),
-            "netusage": self.get_network_io_usage(),
+    def get_network_facts(self):
+        # Addresses and link stats share one watcher, so they are refreshed together
+        retndata = {
             "netaddrs": self.get_network_if_addresses(),
             "netstats": self.get_network_statistics(),
-            "boottime": self.get_boot_time(),
-            "procinfo": self.get_process_listing_info(),
-            "sensread": {
-                "senstemp": self.get_sensors_temperature(),
-                "fanspeed": self.get_sensors_fan_speed(),
-                "battstat": self.get_sensors_battery_status()
-            }
         }
-        return jsonobjc
\ No newline at end of file
+        return retndata
+
+    def return_live_section(self, sectname):
+        if self.sampler is not None:
+            jsonobjc = self.sampler.return_live_data([sectname])
+            if sectname in jsonobjc:
+                return jsonobjc[sectname]
+        return self.return_live_collectors()[sectname]()
+
+    def return_dead_collectors(self):
+        collects = {
+            "osnmdata": lambda: self.memoize("osnmdata", self.get_os_uname_data),
+            "cpuquant": lambda: self.memoize("cpuquant", self.get_cpu_logical_count),
+            "cpuclock": lambda: self.return_live_section("cpuclock"),
+            "diskpart": lambda: self.memoize("diskpart", self.get_all_disk_partitions, self.mntwatch),
+            "diousage": lambda: self.return_live_section("diousage"),
+            "netusage": lambda: self.return_live_section("netusage"),
+            "netaddrs": lambda: self.memoize("netfacts", self.get_network_facts, self.lnkwatch)["netaddrs"],
+            "netstats": lambda: self.memoize("netfacts", self.get_network_facts, self.lnkwatch)["netstats"],
+            "boottime": lambda: self.memoize("boottime", self.get_boot_time),
+            "procinfo": lambda: self.return_live_section("procinfo"),
+            "sensread": lambda: self.return_live_section("sensread"),
+        }
+        return collects
+
+    def return_dead_data(self, sections=None):
+        jsonobjc = {}
+        for indx, collfunc in self.return_dead_collectors().items():
+            if sections is None or indx in sections:
+                jsonobjc[indx] = collfunc()
+        return jsonobjc
@@ -0,0 +1,227 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import math
+import threading
+from array import array
+
+# (bucket width in seconds, number of buckets) - 1s for 10min, 10s for 6h, 1min for 7d
+HISTORY_TIERS = ((1, 600), (10, 2160), (60, 10080))
+# Seconds without a sample after which a series gives its place up to a new one once the cap is reached
+SERIES_IDLE = 600.0
+
+
+class HistoryTier:
+    def __init__(self, step, capacity):
+        self.step = step
+        self.capacity = capacity
+        self.buckets = array("q", [-1]) * capacity
+        self.series = {}
+        self.accums = {}
+        self.current = None
+
+    def add_series(self, metrname):
+        self.series[metrname] = array("f", [math.nan]) * self.capacity
+
+    def remove_series(self, metrname):
+        self.series.pop(metrname, None)
+        self.accums.pop(metrname, None)
+
+    def flush_bucket(self):
+        slotindx = self.current % self.capacity
+        self.buckets[slotindx] = self.current
+        for metrname, values in self.series.items():
+            accum = self.accums.get(metrname)
+            values[slotindx] = accum[0] / accum[1] if accum else math.nan
+        self.accums = {}
+
+    def record(self, timestmp, samples):
+        bucket = int(timestmp // self.step)
+        if self.current is not None and bucket != self.current:
+            self.flush_bucket()
+        self.current = bucket
+        for metrname, value in samples.items():
+            if metrname not in self.series:
+                continue
+            accum = self.accums.get(metrname)
+            if accum is None:
+                self.accums[metrname] = [value, 1]
+            else:
+                accum[0] += value
+                accum[1] += 1
+
+    def query(self, metrname, strttime, stoptime):
+        values = self.series.get(metrname)
+        if values is None or self.current is None:
+            return []
+        retndata = []
+        frstbuck = max(int(strttime // self.step), self.current - self.capacity + 1)
+        for bucket in range(frstbuck, min(int(stoptime // self.step), self.current) + 1):
+            if bucket == self.current:
+                # The open bucket is served as the running average so far
+                accum = self.accums.get(metrname)
+                value = accum[0] / accum[1] if accum else math.nan
+            else:
+                slotindx = bucket % self.capacity
+                # Slots left over from an earlier lap of the ring are stale, not data
+                if self.buckets[slotindx] != bucket:
+                    continue
+                value = values[slotindx]
+            if not math.isnan(value):
+                retndata.append([bucket * self.step, round(value, 3)])
+        return retndata
+
+
+class HistoryStore:
+    def __init__(self, maxseries=128, tiers=HISTORY_TIERS):
+        self.maxseries = maxseries
+        self.tiers = [HistoryTier(step, capacity) for step, capacity in tiers]
+        self.metrics = set()
+        self.lastseen = {}
+        self.firstime = None
+        self.lockobjc = threading.Lock()
+
+    def memory_bytes(self):
+        # Every series is preallocated, so this is the ceiling as well as the current size
+        slotsize = array("f").itemsize
+        retndata = 0
+        for tier in self.tiers:
+            retndata += tier.capacity * (array("q").itemsize + slotsize * len(tier.series))
+        return retndata
+
+    def record(self, timestmp, samples):
+        with self.lockobjc:
+            if self.firstime is None:
+                self.firstime = timestmp
+            idlelist = None
+            for metrname in samples:
+                if metrname not in self.metrics:
+                    if len(self.metrics) >= self.maxseries:
+                        if idlelist is None:
+                            idlelist = sorted((indx for indx, seentime in self.lastseen.items()
+                                               if timestmp - seentime > SERIES_IDLE),
+                                              key=self.lastseen.get, reverse=True)
+                        if not idlelist:
+                            continue
+                        self.remove_series(idlelist.pop())
+                    self.metrics.add(metrname)
+                    for tier in self.tiers:
+                        tier.add_series(metrname)
+                self.lastseen[metrname] = timestmp
+            for tier in self.tiers:
+                tier.record(timestmp, samples)
+
+    def remove_series(self, metrname):
+        self.metrics.discard(metrname)
+        self.lastseen.pop(metrname, None)
+        for tier in self.tiers:
+            tier.remove_series(metrname)
+
+    def return_coverage_start(self):
+        with self.lockobjc:
+            if self.firstime is None:
+                return float("inf")
+            tier = self.tiers[-1]
+            return max(self.firstime, (tier.current - tier.capacity + 1) * tier.step)
+
+    def pick_tier(self, strttime, stoptime, step=None):
+        if step is not None:
+            for tier in self.tiers:
+                if tier.step >= step:
+                    return tier
+            return self.tiers[-1]
+        # The finest tier whose ring still reaches back to the start of the range, give or take one bucket
+        for tier in self.tiers:
+            if tier.current is None or (tier.current - tier.capacity + 1) * tier.step <= strttime + tier.step:
+                return tier
+        return self.tiers[-1]
+
+    def query(self, metrlist, strttime, stoptime, step=None):
+        with self.lockobjc:
+            tier = self.pick_tier(strttime, stoptime, step)
+            retndata = {
+                "start": strttime,
+                "end": stoptime,
+                "step": tier.step,
+                "series": {indx: tier.query(indx, strttime, stoptime) for indx in metrlist},
+            }
+        return retndata
+
+    def return_metric_names(self):
+        with self.lockobjc:
+            return sorted(self.metrics)
+
+
+def extract_samples(jsonobjc):
+    samples = {}
+    for indx, value in jsonobjc.get("cpuprcnt", {}).items():
+        samples["cpuprcnt.%s" % indx] = value
+    # A collector that failed before its first success leaves an empty section, those are skipped
+    for sectname, keylist in (("virtdata", ("percent", "used")),
+                              ("swapinfo", ("percent", "used", "sin_rate", "sout_rate"))):
+        sectdata = jsonobjc.get(sectname) or {}
+        for indx in keylist:
+            if sectdata.get(indx) is not None:
+                samples["%s.%s" % (sectname, indx)] = sectdata[indx]
+    # Series are admitted first-come, temperatures go ahead of the per-device ones to survive the cap
+    senstemp = (jsonobjc.get("sensread") or {}).get("senstemp", {})
+    for chipname, readings in senstemp.items():
+        for jndx, reading in enumerate(readings):
+            try:
+                samples["senstemp.%s.%s" % (chipname, reading["label"] or jndx)] = float(reading["current"])
+            except (TypeError, ValueError):
+                pass
+    for mountpnt, diskused in jsonobjc.get("diskused", {}).items():
+        if diskused.get("percent") is not None:
+            samples["diskused.%s.percent" % mountpnt] = diskused["percent"]
+    for sectname, ratelist in (("diousage", ("read_bytes_rate", "write_bytes_rate")),
+                               ("netusage", ("bytes_recv_rate", "bytes_sent_rate"))):
+        for devcname, devcdata in jsonobjc.get(sectname, {}).items():
+            for ratename in ratelist:
+                if devcdata.get(ratename) is not None:
+                    samples["%s.%s.%s" % (sectname, devcname, ratename)] = devcdata[ratename]
+    return samples
+
+
+class SnapshotSamples:
+    def __init__(self):
+        self.cachdata = (None, {})
+
+    def __call__(self, snapshot):
+        # Every consumer of one snapshot shares a single extraction
+        cachdata = self.cachdata
+        if cachdata[0] is not snapshot:
+            cachdata = (snapshot, extract_samples(snapshot.jsonobjc))
+            self.cachdata = cachdata
+        return cachdata[1]
+
+
+snapshot_samples = SnapshotSamples()
+
+
+class HistoryRecorder:
+    def __init__(self, *storages):
+        self.storages = storages
+
+    def __call__(self, snapshot):
+        samples = snapshot_samples(snapshot)
+        for indx in self.storages:
+            indx.record(snapshot.timestmp, samples)
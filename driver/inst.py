@@ -0,0 +1,175 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import click
+import psutil
+
+# Upper bounds in milliseconds, the last bucket takes everything slower
+DURATION_BOUNDS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0)
+
+
+class DurationHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BOUNDS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.totltime = 0.0
+        self.maxtime = 0.0
+        self.lasterror = None
+
+    def observe(self, duration):
+        self.buckets[bisect.bisect_left(DURATION_BOUNDS, duration)] += 1
+        self.count += 1
+        self.totltime += duration
+        if duration > self.maxtime:
+            self.maxtime = duration
+
+    def quantile(self, fraction):
+        # Reported as the upper bound of the bucket holding the quantile
+        target, running = self.count * fraction, 0
+        for indx, bucket in enumerate(self.buckets):
+            running += bucket
+            if running >= target and bucket:
+                return DURATION_BOUNDS[indx] if indx < len(DURATION_BOUNDS) else round(self.maxtime, 3)
+        return None
+
+    def return_stats(self):
+        retndata = {
+            "count": self.count,
+            "errors": self.errors,
+            "last_error": self.lasterror,
+            "mean_ms": round(self.totltime / self.count, 3) if self.count else None,
+            "max_ms": round(self.maxtime, 3),
+            "p50_ms": self.quantile(0.50),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {("%g" % bound): self.buckets[indx] for indx, bound in enumerate(DURATION_BOUNDS)},
+        }
+        retndata["buckets"]["+Inf"] = self.buckets[-1]
+        return retndata
+
+
+class SelfStatistics:
+    def __init__(self, slowms=250.0, slowecho=False, slowsize=100):
+        self.slowms = slowms
+        self.slowecho = slowecho
+        self.collectors = {}
+        self.routes = {}
+        self.slowlog = deque(maxlen=slowsize)
+        self.lockobjc = threading.Lock()
+        self.procobjc = psutil.Process(os.getpid())
+        self.strttime = time.time()
+
+    def observe(self, tablname, name, duration, errtext=None):
+        with self.lockobjc:
+            table = self.collectors if tablname == "collector" else self.routes
+            histobjc = table.get(name)
+            if histobjc is None:
+                histobjc = table[name] = DurationHistogram()
+            histobjc.observe(duration)
+            if errtext is not None:
+                histobjc.errors += 1
+                histobjc.lasterror = errtext
+            if tablname == "collector" and duration >= self.slowms:
+                self.slowlog.append({"collector": name, "duration_ms": round(duration, 3), "timestmp": time.time()})
+            else:
+                return
+        if self.slowecho:
+            click.echo(" * " + click.style("Slow collector", fg="yellow") + ": " + name + " took " +
+                       "%.1f" % duration + "ms")
+
+    def timed(self, name, collfunc):
+        @functools.wraps(collfunc)
+        def wrapper(*args, **kwargs):
+            strttime = time.perf_counter()
+            try:
+                retndata = collfunc(*args, **kwargs)
+            except Exception as expt:
+                self.observe("collector", name, (time.perf_counter() - strttime) * 1000,
+                             "%s: %s" % (type(expt).__name__, expt))
+                raise
+            self.observe("collector", name, (time.perf_counter() - strttime) * 1000)
+            return retndata
+        return wrapper
+
+    def instrument(self, objc):
+        # Instance attributes shadow the methods, so collectors calling each other are timed individually too
+        for indx in dir(objc):
+            if indx.startswith("get_") and callable(getattr(objc, indx)):
+                setattr(objc, indx, self.timed(indx, getattr(objc, indx)))
+        return objc
+
+    def return_process_stats(self):
+        with self.procobjc.oneshot():
+            meminfo = self.procobjc.memory_info()
+            cputimes = self.procobjc.cpu_times()
+            retndata = {
+                "pid": self.procobjc.pid,
+                "rss": meminfo.rss,
+                "vms": meminfo.vms,
+                "cpu_percent": self.procobjc.cpu_percent(),
+                "cpu_user": cputimes.user,
+                "cpu_system": cputimes.system,
+                "num_threads": self.procobjc.num_threads(),
+                "num_fds": self.procobjc.num_fds() if hasattr(self.procobjc, "num_fds") else None,
+                "uptime": round(time.time() - self.strttime, 3),
+            }
+        return retndata
+
+    def return_self_stats(self):
+        with self.lockobjc:
+            retndata = {
+                "collectors": {name: histobjc.return_stats() for name, histobjc in sorted(self.collectors.items())},
+                "routes": {name: histobjc.return_stats() for name, histobjc in sorted(self.routes.items())},
+                "slowlog": list(self.slowlog),
+                "slowms": self.slowms,
+            }
+        retndata["process"] = self.return_process_stats()
+        return retndata
+
+
+class RequestTimingMiddleware:
+    def __init__(self, selfstat):
+        self.selfstat = selfstat
+
+    def process_request(self, rqst, resp):
+        rqst.context.strttime = time.perf_counter()
+
+    def process_response(self, rqst, resp, resource, req_succeeded):
+        strttime = getattr(rqst.context, "strttime", None)
+        if strttime is None:
+            return
+        # Grouped by route template so every static file does not get its own histogram
+        routname = rqst.uri_template or "unrouted"
+        self.selfstat.observe("route", routname, (time.perf_counter() - strttime) * 1000,
+                              None if req_succeeded else str(resp.status))
+
+    async def process_request_async(self, rqst, resp):
+        self.process_request(rqst, resp)
+
+    async def process_response_async(self, rqst, resp, resource, req_succeeded):
+        self.process_response(rqst, resp, resource, req_succeeded)
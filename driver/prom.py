@@ -0,0 +1,235 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import math
+import threading
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PLAINTEXT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+MEMORY_KINDS = ("total", "available", "used", "active", "inactive", "buffers", "cached", "shared", "slab")
+CPU_MODES = ("user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal", "guest", "guest_nice")
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def per_device(fieldname, scale=None):
+    def extract(sectdata):
+        for devcname, devcdata in sectdata.items():
+            value = devcdata.get(fieldname)
+            if value is not None:
+                yield (devcname,), value * scale if scale is not None else value
+    return extract
+
+
+def per_field(fieldlist):
+    def extract(sectdata):
+        for indx in fieldlist:
+            if indx in sectdata:
+                yield (indx,), sectdata[indx]
+    return extract
+
+
+def per_device_field(fieldlist):
+    def extract(sectdata):
+        for devcname, devcdata in sectdata.items():
+            for indx in fieldlist:
+                if indx in devcdata:
+                    yield (devcname, indx), devcdata[indx]
+    return extract
+
+
+def single_field(fieldname):
+    def extract(sectdata):
+        if fieldname in sectdata:
+            yield (), sectdata[fieldname]
+    return extract
+
+
+def per_sensor(sensname):
+    def extract(sectdata):
+        for chipname, readings in sectdata.get(sensname, {}).items():
+            seenlist = set()
+            for indx, reading in enumerate(readings):
+                try:
+                    value = float(reading["current"])
+                except (TypeError, ValueError, KeyError):
+                    continue
+                # A label repeated within one chip would make a duplicate series, the index tells them apart
+                labelval = reading.get("label") or str(indx)
+                if labelval in seenlist:
+                    labelval = "%s_%d" % (labelval, indx)
+                seenlist.add(labelval)
+                yield (chipname, labelval), value
+    return extract
+
+
+def count_entries(sectdata):
+    yield (), len(sectdata)
+
+
+# (family, type, help, live section, label names, extractor)
+METRIC_FAMILIES = (
+    ("pimonitor_cpu_usage_percent", "gauge", "Per-CPU utilisation over the last sampling interval.", "cpuprcnt",
+     ("cpu",), lambda sectdata: (((indx,), value) for indx, value in sectdata.items())),
+    ("pimonitor_cpu_seconds", "counter", "Seconds each CPU spent in each mode.", "cputimes",
+     ("cpu", "mode"), per_device_field(CPU_MODES)),
+    ("pimonitor_cpu_frequency_mhz", "gauge", "Current CPU clock speed.", "cpuclock",
+     ("cpu",), per_device("current")),
+    ("pimonitor_context_switches", "counter", "Context switches since boot.", "cpustats",
+     (), single_field("ctx_switches")),
+    ("pimonitor_interrupts", "counter", "Interrupts since boot.", "cpustats",
+     (), single_field("interrupts")),
+    ("pimonitor_soft_interrupts", "counter", "Soft interrupts since boot.", "cpustats",
+     (), single_field("soft_interrupts")),
+    ("pimonitor_memory_bytes", "gauge", "Virtual memory by kind.", "virtdata",
+     ("kind",), per_field(MEMORY_KINDS)),
+    ("pimonitor_memory_usage_percent", "gauge", "Virtual memory in use.", "virtdata",
+     (), single_field("percent")),
+    ("pimonitor_swap_bytes", "gauge", "Swap space by kind.", "swapinfo",
+     ("kind",), per_field(("total", "used", "free"))),
+    ("pimonitor_swap_in_bytes", "counter", "Bytes swapped in since boot.", "swapinfo",
+     (), single_field("sin")),
+    ("pimonitor_swap_out_bytes", "counter", "Bytes swapped out since boot.", "swapinfo",
+     (), single_field("sout")),
+    ("pimonitor_disk_read_bytes", "counter", "Bytes read from each disk.", "diousage",
+     ("disk",), per_device("read_bytes")),
+    ("pimonitor_disk_written_bytes", "counter", "Bytes written to each disk.", "diousage",
+     ("disk",), per_device("write_bytes")),
+    ("pimonitor_disk_reads_completed", "counter", "Reads completed on each disk.", "diousage",
+     ("disk",), per_device("read_count")),
+    ("pimonitor_disk_writes_completed", "counter", "Writes completed on each disk.", "diousage",
+     ("disk",), per_device("write_count")),
+    ("pimonitor_disk_io_time_seconds", "counter", "Seconds each disk spent doing I/O.", "diousage",
+     ("disk",), per_device("busy_time", 0.001)),
+    ("pimonitor_filesystem_size_bytes", "gauge", "Size of each mounted filesystem.", "diskused",
+     ("mountpoint",), per_device("total")),
+    ("pimonitor_filesystem_free_bytes", "gauge", "Free space on each mounted filesystem.", "diskused",
+     ("mountpoint",), per_device("free")),
+    ("pimonitor_filesystem_usage_percent", "gauge", "Space in use on each mounted filesystem.", "diskused",
+     ("mountpoint",), per_device("percent")),
+    ("pimonitor_network_receive_bytes", "counter", "Bytes received on each interface.", "netusage",
+     ("nic",), per_device("bytes_recv")),
+    ("pimonitor_network_transmit_bytes", "counter", "Bytes sent on each interface.", "netusage",
+     ("nic",), per_device("bytes_sent")),
+    ("pimonitor_network_receive_packets", "counter", "Packets received on each interface.", "netusage",
+     ("nic",), per_device("packets_recv")),
+    ("pimonitor_network_transmit_packets", "counter", "Packets sent on each interface.", "netusage",
+     ("nic",), per_device("packets_sent")),
+    ("pimonitor_network_receive_errors", "counter", "Receive errors on each interface.", "netusage",
+     ("nic",), per_device("errin")),
+    ("pimonitor_network_transmit_errors", "counter", "Transmit errors on each interface.", "netusage",
+     ("nic",), per_device("errout")),
+    ("pimonitor_network_receive_drops", "counter", "Inbound packets dropped on each interface.", "netusage",
+     ("nic",), per_device("dropin")),
+    ("pimonitor_network_transmit_drops", "counter", "Outbound packets dropped on each interface.", "netusage",
+     ("nic",), per_device("dropout")),
+    ("pimonitor_sensor_temperature_celsius", "gauge", "Temperature reported by each sensor.", "sensread",
+     ("chip", "label"), per_sensor("senstemp")),
+    ("pimonitor_sensor_fan_rpm", "gauge", "Speed reported by each fan.", "sensread",
+     ("chip", "label"), per_sensor("fanspeed")),
+    ("pimonitor_processes", "gauge", "Processes in the sampled listing.", "procinfo",
+     (), count_entries),
+)
+
+
+class MetricFamily:
+    def __init__(self, famname, famtype, helptext, sectname, labelnms, extract):
+        self.sectname = sectname
+        self.labelnms = labelnms
+        self.extract = extract
+        # OpenMetrics names the counter family without the suffix, the older text format names the samples
+        self.smplname = famname + "_total" if famtype == "counter" else famname
+        self.headers = {
+            True: "# HELP %s %s\n# TYPE %s %s\n" % (famname, helptext, famname, famtype),
+            False: "# HELP %s %s\n# TYPE %s %s\n" % (self.smplname, helptext, self.smplname, famtype),
+        }
+        self.prefixes = {}
+
+    def return_prefix(self, labelval):
+        prefix = self.prefixes.get(labelval)
+        if prefix is None:
+            if labelval:
+                prefix = "%s{%s} " % (self.smplname, ",".join(
+                    "%s=\"%s\"" % (name, escape_label(value)) for name, value in zip(self.labelnms, labelval)
+                ))
+            else:
+                prefix = self.smplname + " "
+            # Label sets are stable between samples, so the series prefix is only rendered once
+            if len(self.prefixes) >= 4096:
+                self.prefixes = {}
+            self.prefixes[labelval] = prefix
+        return prefix
+
+    def render(self, jsonobjc, openmtrc, linelist):
+        sectdata = jsonobjc.get(self.sectname)
+        if not sectdata:
+            return
+        linelist.append(self.headers[openmtrc])
+        for labelval, value in self.extract(sectdata):
+            linelist.append(self.return_prefix(labelval) + format_value(value) + "\n")
+
+
+class MetricsRenderer:
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.families = [MetricFamily(*indx) for indx in METRIC_FAMILIES]
+        self.rendered = {}
+        self.seqnumbr = None
+        self.lockobjc = threading.Lock()
+
+    def render_snapshot(self, snapshot, openmtrc):
+        linelist = []
+        for indx in self.families:
+            indx.render(snapshot.jsonobjc, openmtrc, linelist)
+        linelist.append("# HELP pimonitor_sample_timestamp_seconds Wall clock time of the served sample.\n"
+                        "# TYPE pimonitor_sample_timestamp_seconds gauge\n"
+                        "pimonitor_sample_timestamp_seconds %s\n" % format_value(snapshot.timestmp))
+        if openmtrc:
+            linelist.append("# EOF\n")
+        return "".join(linelist).encode("utf-8")
+
+    def render(self, openmtrc=True):
+        snapshot = self.sampler.latest_snapshot()
+        if snapshot is None:
+            return b"# EOF\n" if openmtrc else b""
+        # Scrapes between two samples are answered from the body rendered for the first of them
+        with self.lockobjc:
+            if snapshot.seqnumbr != self.seqnumbr:
+                self.seqnumbr = snapshot.seqnumbr
+                self.rendered = {}
+            bodydata = self.rendered.get(openmtrc)
+            if bodydata is None:
+                bodydata = self.rendered[openmtrc] = self.render_snapshot(snapshot, openmtrc)
+        return bodydata
@@ -0,0 +1,279 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+import click
+
+SEGMENT_MAGIC = b"PMTS"
+SEGMENT_VERSION = 1
+# Segment header carries the base wall clock time, every record is stamped relative to it
+SEGMENT_HEADER = struct.Struct("<4sHd")
+# Fixed-width record frame of millisecond offset and payload length, the payload is varints
+RECORD_HEADER = struct.Struct("<IH")
+MAXIMUM_PAYLOAD = 0xFFFF
+VALUE_QUANTUM = 1000
+MAXIMUM_OFFSET = 2 ** 32 - 1
+
+
+def encode_varint(value, buffer):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def decode_varint(buffer, offset):
+    value, shift = 0, 0
+    while True:
+        bytedata = buffer[offset]
+        offset += 1
+        value |= (bytedata & 0x7F) << shift
+        if bytedata < 0x80:
+            return value, offset
+        shift += 7
+
+
+def zigzag_encode(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def zigzag_decode(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+class DiskHistoryStore:
+    def __init__(self, datapath, maxbytes=64 * 1024 * 1024, segbytes=1024 * 1024, flushint=60.0, maxseries=128):
+        self.datapath = datapath
+        self.maxseries = maxseries
+        self.maxbytes = maxbytes
+        self.segbytes = segbytes
+        self.flushint = flushint
+        self.lockobjc = threading.Lock()
+        os.makedirs(datapath, exist_ok=True)
+        self.idxpath = os.path.join(datapath, "metrics.idx")
+        self.metrics = {}
+        if os.path.exists(self.idxpath):
+            with open(self.idxpath, "r", encoding="utf-8") as fileobjc:
+                for indx in fileobjc.read().splitlines():
+                    self.metrics[indx] = len(self.metrics)
+        self.metrname = {metriden: indx for indx, metriden in self.metrics.items()}
+        # Newest segment each identifier was written to, known ones are pinned to the newest on disk
+        segments = self.list_segments()
+        self.idseen = {indx: segments[-1][1] if segments else None for indx in self.metrname}
+        self.reclaim = True
+        self.warned = False
+        self.pending = bytearray()
+        self.segpath = None
+        self.segbase = None
+        self.segsize = 0
+        self.lastvals = {}
+        self.lastflush = time.monotonic()
+
+    def list_segments(self):
+        retndata = []
+        for indx in sorted(os.listdir(self.datapath)):
+            if indx.endswith(".seg"):
+                retndata.append((int(indx[:-4]) / 1000, os.path.join(self.datapath, indx)))
+        return retndata
+
+    def reclaim_identifier(self):
+        # An identifier whose last segment was retired has no samples left on disk and can be reused
+        retained = {indx[1] for indx in self.list_segments()}
+        for metriden, segpath in self.idseen.items():
+            if segpath not in retained:
+                del self.metrics[self.metrname[metriden]]
+                return metriden
+        return None
+
+    def metric_identifier(self, metrname):
+        metriden = self.metrics.get(metrname)
+        if metriden is None:
+            freshidn = len(self.metrname) < self.maxseries
+            if freshidn:
+                metriden = len(self.metrname)
+            elif self.reclaim:
+                metriden = self.reclaim_identifier()
+                # Nothing frees up until retention retires another segment
+                self.reclaim = metriden is not None
+            if metriden is None:
+                if not self.warned:
+                    self.warned = True
+                    click.echo(" * " + click.style("History storage", fg="yellow") + ": " + "the limit of " +
+                               str(self.maxseries) + " series is reached, new series are not stored")
+                return None
+            self.metrics[metrname] = metriden
+            self.metrname[metriden] = metrname
+            if freshidn:
+                with open(self.idxpath, "a", encoding="utf-8") as fileobjc:
+                    fileobjc.write(metrname + "\n")
+            else:
+                self.write_index()
+        self.idseen[metriden] = self.segpath
+        return metriden
+
+    def write_index(self):
+        tempath = self.idxpath + ".tmp"
+        with open(tempath, "w", encoding="utf-8") as fileobjc:
+            fileobjc.write("".join(self.metrname[indx] + "\n" for indx in range(len(self.metrname))))
+        os.replace(tempath, self.idxpath)
+
+    def open_segment(self, timestmp):
+        self.flush_pending()
+        self.segbase = timestmp
+        self.segpath = os.path.join(self.datapath, "%013d.seg" % int(timestmp * 1000))
+        self.pending += SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, timestmp)
+        self.segsize = SEGMENT_HEADER.size
+        # Values are delta coded within a segment, so each one starts from zero
+        self.lastvals = {}
+
+    def enforce_retention(self):
+        segments = self.list_segments()
+        sizelist = []
+        for indx in segments:
+            try:
+                sizelist.append(os.path.getsize(indx[1]))
+            except OSError:
+                sizelist.append(0)
+        totlsize = sum(sizelist)
+        for (strttime, segpath), segsize in zip(segments, sizelist):
+            if totlsize <= self.maxbytes or segpath == self.segpath:
+                break
+            try:
+                os.remove(segpath)
+            except OSError:
+                pass
+            totlsize -= segsize
+            self.reclaim = True
+
+    def flush_pending(self):
+        if self.pending and self.segpath is not None:
+            with open(self.segpath, "ab") as fileobjc:
+                fileobjc.write(self.pending)
+            self.pending = bytearray()
+            self.enforce_retention()
+        self.lastflush = time.monotonic()
+
+    def append_record(self, timeoffs, payload):
+        recdata = RECORD_HEADER.pack(timeoffs, len(payload)) + payload
+        self.pending += recdata
+        self.segsize += len(recdata)
+
+    def record(self, timestmp, samples):
+        with self.lockobjc:
+            if self.segpath is None or self.segsize >= self.segbytes or \
+                    (timestmp - self.segbase) * 1000 > MAXIMUM_OFFSET:
+                self.open_segment(timestmp)
+            timeoffs = max(int((timestmp - self.segbase) * 1000), 0)
+            payload = bytearray()
+            for metrname, value in samples.items():
+                metriden = self.metric_identifier(metrname)
+                if metriden is None:
+                    continue
+                quantize = int(round(value * VALUE_QUANTUM))
+                entry = bytearray()
+                encode_varint(metriden, entry)
+                encode_varint(zigzag_encode(quantize - self.lastvals.get(metriden, 0)), entry)
+                # Every encoded delta is written, a sample too large for one frame spans several
+                if len(payload) + len(entry) > MAXIMUM_PAYLOAD:
+                    self.append_record(timeoffs, payload)
+                    payload = bytearray()
+                payload += entry
+                self.lastvals[metriden] = quantize
+            self.append_record(timeoffs, payload)
+            # Writes are batched to spare SD cards from one small write per sample
+            if time.monotonic() - self.lastflush >= self.flushint:
+                self.flush_pending()
+
+    def close(self):
+        with self.lockobjc:
+            self.flush_pending()
+
+    def scan_segment(self, segpath, metrids, strttime, stoptime, callback):
+        try:
+            with open(segpath, "rb") as fileobjc:
+                if os.fstat(fileobjc.fileno()).st_size < SEGMENT_HEADER.size:
+                    return
+                mapobjc = mmap.mmap(fileobjc.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        try:
+            magic, version, segbase = SEGMENT_HEADER.unpack_from(mapobjc, 0)
+            if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+                return
+            lastvals = {}
+            offset = SEGMENT_HEADER.size
+            filesize = len(mapobjc)
+            while offset + RECORD_HEADER.size <= filesize:
+                timeoffs, paylngth = RECORD_HEADER.unpack_from(mapobjc, offset)
+                offset += RECORD_HEADER.size
+                paylstop = offset + paylngth
+                # A torn tail from an unclean shutdown ends the segment
+                if paylstop > filesize:
+                    return
+                timestmp = segbase + timeoffs / 1000
+                while offset < paylstop:
+                    metriden, offset = decode_varint(mapobjc, offset)
+                    deltaval, offset = decode_varint(mapobjc, offset)
+                    lastvals[metriden] = lastvals.get(metriden, 0) + zigzag_decode(deltaval)
+                    if metriden in metrids and strttime <= timestmp <= stoptime:
+                        callback(metrids[metriden], timestmp, lastvals[metriden] / VALUE_QUANTUM)
+                if timestmp > stoptime:
+                    return
+        finally:
+            mapobjc.close()
+
+    def query(self, metrlist, strttime, stoptime, step=None):
+        with self.lockobjc:
+            metrids = {self.metrics[indx]: indx for indx in metrlist if indx in self.metrics}
+            segments = self.list_segments()
+        if step is None:
+            step = max(int((stoptime - strttime) / 1000), 1)
+        accums = {indx: {} for indx in metrlist}
+
+        def accumulate(metrname, timestmp, value):
+            bucket = int(timestmp // step)
+            accum = accums[metrname].get(bucket)
+            if accum is None:
+                accums[metrname][bucket] = [value, 1]
+            else:
+                accum[0] += value
+                accum[1] += 1
+
+        for indx, (segstart, segpath) in enumerate(segments):
+            segstop = segments[indx + 1][0] if indx + 1 < len(segments) else float("inf")
+            if segstart > stoptime or segstop < strttime:
+                continue
+            self.scan_segment(segpath, metrids, strttime, stoptime, accumulate)
+        retndata = {
+            "start": strttime,
+            "end": stoptime,
+            "step": step,
+            "series": {
+                metrname: [[bucket * step, round(accum[0] / accum[1], 3)] for bucket, accum in sorted(buckets.items())]
+                for metrname, buckets in accums.items()
+            },
+        }
+        return retndata
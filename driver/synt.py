@@ -0,0 +1,255 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import contextlib
+import os
+import random
+import time
+
+import psutil
+
+PROCESS_NAMES = (
+    "systemd", "kthreadd", "sshd", "bash", "python3", "nginx", "cron", "dbus-daemon", "rsyslogd", "avahi-daemon",
+    "systemd-journald", "systemd-networkd", "wpa_supplicant", "containerd-shim", "NetworkManager",
+)
+PROCESS_USERS = (0, 1000, 65534)
+
+
+class SyntheticHost:
+    def __init__(self, rootpath, procs=100, cpus=4, disks=2, nics=2, chips=2, readings=4, cgroups=8, seed=0):
+        self.rootpath = rootpath
+        self.procpath = os.path.join(rootpath, "proc")
+        self.sysfpath = os.path.join(rootpath, "sys")
+        self.procs = procs
+        self.cpus = cpus
+        self.disks = ["mmcblk0"] + ["sd%s" % chr(ord("a") + indx) for indx in range(disks - 1)] if disks else []
+        self.nics = ["lo"] + ["eth%d" % indx for indx in range(nics - 1)] if nics else []
+        self.chips = chips
+        self.cgrppath = os.path.join(self.sysfpath, "fs", "cgroup")
+        self.cgroups = ["/system.slice/service%d.service" % indx for indx in range(cgroups)]
+        self.readings = readings
+        self.random = random.Random(seed)
+        self.clockhtz = os.sysconf("SC_CLK_TCK")
+        self.pagesize = os.sysconf("SC_PAGE_SIZE")
+        self.boottime = int(time.time()) - 86400
+        self.uptime = 86400.0
+        self.counters = {}
+        self.processes = {}
+        self.build()
+
+    def write_file(self, filepath, content):
+        with open(filepath, "w") as fileobjc:
+            fileobjc.write(content)
+
+    def build(self):
+        os.makedirs(os.path.join(self.procpath, "self"), exist_ok=True)
+        for prociden in range(1, self.procs + 1):
+            self.processes[prociden] = {
+                "name": PROCESS_NAMES[prociden % len(PROCESS_NAMES)],
+                # Random earlier parents give the listing a realistic forest for the tree views
+                "ppid": self.random.randint(1, prociden - 1) if prociden > 1 else 0,
+                "uid": PROCESS_USERS[prociden % len(PROCESS_USERS)],
+                "utime": self.random.randint(0, 50000),
+                "stime": self.random.randint(0, 20000),
+                "start": self.random.randint(100, int(self.uptime * self.clockhtz)),
+                "rss": self.random.randint(64, 65536),
+                "threads": self.random.randint(1, 16),
+            }
+            os.makedirs(os.path.join(self.procpath, str(prociden)), exist_ok=True)
+            self.write_process(prociden)
+            self.write_file(os.path.join(self.procpath, str(prociden), "cgroup"),
+                            "0::%s\n" % self.process_cgroup(prociden))
+        mountlist = []
+        for indx, diskname in enumerate(self.disks):
+            mountpnt = os.path.join(self.rootpath, "mnt", diskname)
+            os.makedirs(mountpnt, exist_ok=True)
+            mountlist.append("/dev/%s %s ext4 rw,relatime 0 0\n" % (diskname, mountpnt))
+        if self.cgroups:
+            mountlist.append("cgroup2 %s cgroup2 rw,nosuid,nodev,noexec 0 0\n" % self.cgrppath)
+            self.build_cgroups()
+        self.write_file(os.path.join(self.procpath, "self", "mounts"), "".join(mountlist))
+        self.write_file(os.path.join(self.procpath, "filesystems"),
+                        "nodev\tproc\nnodev\tsysfs\nnodev\tcgroup2\n\text4\n\tvfat\n")
+        self.write_file(os.path.join(self.procpath, "cpuinfo"), "".join(
+            "processor\t: %d\ncpu MHz\t\t: 1500.000\n\n" % indx for indx in range(self.cpus)
+        ))
+        for chipindx in range(self.chips):
+            hwmnpath = os.path.join(self.sysfpath, "class", "hwmon", "hwmon%d" % chipindx)
+            os.makedirs(hwmnpath, exist_ok=True)
+            self.write_file(os.path.join(hwmnpath, "name"), "chip%d\n" % chipindx)
+            for indx in range(1, self.readings + 1):
+                self.write_file(os.path.join(hwmnpath, "temp%d_input" % indx), "%d\n" % (40000 + indx * 1500))
+                self.write_file(os.path.join(hwmnpath, "temp%d_label" % indx), "Core %d\n" % indx)
+                self.write_file(os.path.join(hwmnpath, "temp%d_crit" % indx), "100000\n")
+            self.write_file(os.path.join(hwmnpath, "fan1_input"), "%d\n" % (1200 + chipindx * 100))
+        self.write_globals()
+
+    def process_cgroup(self, prociden):
+        # The init process stays in the root cgroup, like a real host
+        if prociden == 1 or not self.cgroups:
+            return "/"
+        return self.cgroups[prociden % len(self.cgroups)]
+
+    def build_cgroups(self):
+        membership = {}
+        for prociden in self.processes:
+            membership.setdefault(self.process_cgroup(prociden), []).append(prociden)
+        os.makedirs(self.cgrppath, exist_ok=True)
+        self.write_file(os.path.join(self.cgrppath, "cgroup.controllers"), "cpu io memory pids\n")
+        for cgrpname in ["/"] + self.cgroups:
+            cgrpdire = os.path.join(self.cgrppath, cgrpname.lstrip("/"))
+            os.makedirs(cgrpdire, exist_ok=True)
+            proclist = membership.get(cgrpname, [])
+            self.write_file(os.path.join(cgrpdire, "cgroup.procs"), "".join("%d\n" % indx for indx in proclist))
+            if cgrpname != "/":
+                rssbytes = sum(self.processes[indx]["rss"] for indx in proclist) * self.pagesize
+                self.write_file(os.path.join(cgrpdire, "memory.current"), "%d\n" % rssbytes)
+                self.write_file(os.path.join(cgrpdire, "memory.max"), "max\n")
+                self.write_file(os.path.join(cgrpdire, "pids.current"), "%d\n" % len(proclist))
+                self.write_file(os.path.join(cgrpdire, "memory.stat"), (
+                    "anon %d\nfile %d\nkernel %d\nshmem 0\npgfault 1000\npgmajfault %d\n"
+                ) % (rssbytes * 3 // 4, rssbytes // 4, rssbytes // 64, len(proclist)))
+        self.write_cgroup_counters()
+
+    def write_cgroup_counters(self, seconds=1.0):
+        for cgrpname in ["/"] + self.cgroups:
+            cgrpdire = os.path.join(self.cgrppath, cgrpname.lstrip("/"))
+            usertime = self.advance_counter((cgrpname, "user_usec"), 150000, seconds)
+            systtime = self.advance_counter((cgrpname, "system_usec"), 50000, seconds)
+            self.write_file(os.path.join(cgrpdire, "cpu.stat"), (
+                "usage_usec %d\nuser_usec %d\nsystem_usec %d\nnr_periods 0\nnr_throttled 0\nthrottled_usec 0\n"
+            ) % (usertime + systtime, usertime, systtime))
+            self.write_file(os.path.join(cgrpdire, "io.stat"), "".join(
+                "%d:%d rbytes=%d wbytes=%d rios=%d wios=%d dbytes=0 dios=0\n" % (
+                    179 if diskname.startswith("mmcblk") else 8, indx * 16,
+                    self.advance_counter((cgrpname, diskname, "rbytes"), 65536, seconds),
+                    self.advance_counter((cgrpname, diskname, "wbytes"), 32768, seconds),
+                    self.advance_counter((cgrpname, diskname, "rios"), 16, seconds),
+                    self.advance_counter((cgrpname, diskname, "wios"), 8, seconds),
+                ) for indx, diskname in enumerate(self.disks)
+            ))
+
+    def write_process(self, prociden):
+        procdata = self.processes[prociden]
+        procpath = os.path.join(self.procpath, str(prociden))
+        rsspages = procdata["rss"]
+        # Fields 3 to 52 of /proc/[pid]/stat, in kernel order
+        statfils = [
+            "S", procdata["ppid"], prociden, prociden, 0, -1, 4194560, 1000, 0, 10, 0,
+            procdata["utime"], procdata["stime"], 0, 0, 20, 0, procdata["threads"], 0, procdata["start"],
+            rsspages * self.pagesize * 4, rsspages, 18446744073709551615, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+            17, prociden % self.cpus, 0, 0, 3, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+        ]
+        self.write_file(os.path.join(procpath, "stat"), "%d (%s) %s\n" % (
+            prociden, procdata["name"][:15], " ".join(str(indx) for indx in statfils)
+        ))
+        self.write_file(os.path.join(procpath, "statm"), "%d %d %d %d 0 %d 0\n" % (
+            rsspages * 4, rsspages, rsspages // 2, 64, rsspages * 2
+        ))
+        self.write_file(os.path.join(procpath, "status"), (
+            "Name:\t{name}\nUmask:\t0022\nState:\tS (sleeping)\nTgid:\t{pid}\nNgid:\t0\nPid:\t{pid}\n"
+            "PPid:\t{ppid}\nTracerPid:\t0\nUid:\t{uid}\t{uid}\t{uid}\t{uid}\nGid:\t{uid}\t{uid}\t{uid}\t{uid}\n"
+            "FDSize:\t64\nVmRSS:\t{rsskb} kB\nThreads:\t{threads}\nvoluntary_ctxt_switches:\t{vcsw}\n"
+            "nonvoluntary_ctxt_switches:\t{ncsw}\n"
+        ).format(name=procdata["name"][:15], pid=prociden, ppid=procdata["ppid"], uid=procdata["uid"],
+                 rsskb=rsspages * self.pagesize // 1024, threads=procdata["threads"], vcsw=procdata["utime"],
+                 ncsw=procdata["stime"]))
+        self.write_file(os.path.join(procpath, "cmdline"), "/usr/bin/%s\x00--synthetic\x00" % procdata["name"])
+
+    def advance_counter(self, countkey, rate, seconds):
+        self.counters[countkey] = self.counters.get(countkey, 0) + int(rate * seconds * self.random.uniform(0.5, 1.5))
+        return self.counters[countkey]
+
+    def write_globals(self, seconds=1.0):
+        self.uptime += seconds
+        cpulines = []
+        for indx in ["cpu"] + ["cpu%d" % jndx for jndx in range(self.cpus)]:
+            scale = self.cpus if indx == "cpu" else 1
+            cpulines.append("%s %s\n" % (indx, " ".join(str(self.advance_counter((indx, mode), rate * scale, seconds))
+                                                        for mode, rate in (("user", 20), ("nice", 0),
+                                                                           ("system", 8), ("idle", 70),
+                                                                           ("iowait", 2), ("irq", 0),
+                                                                           ("softirq", 1), ("steal", 0),
+                                                                           ("guest", 0), ("guest_nice", 0)))))
+        self.write_file(os.path.join(self.procpath, "stat"), "".join(cpulines) + (
+            "intr %d 0 0\nctxt %d\nbtime %d\nprocesses %d\nprocs_running 1\nprocs_blocked 0\nsoftirq %d 0 0\n"
+        ) % (self.advance_counter("intr", 5000, seconds), self.advance_counter("ctxt", 9000, seconds),
+             self.boottime, self.procs, self.advance_counter("softirq", 3000, seconds)))
+        self.write_file(os.path.join(self.procpath, "meminfo"), (
+            "MemTotal:        3884096 kB\nMemFree:         1204512 kB\nMemAvailable:    2801232 kB\n"
+            "Buffers:           90212 kB\nCached:          1492760 kB\nSwapCached:         1024 kB\n"
+            "Active:          1345600 kB\nInactive:         980112 kB\nActive(anon):     600000 kB\n"
+            "Inactive(anon):    90000 kB\nActive(file):     745600 kB\nInactive(file):   890112 kB\n"
+            "Shmem:             40960 kB\nSlab:             120000 kB\nSReclaimable:      80000 kB\n"
+            "SUnreclaim:        40000 kB\nSwapTotal:        102396 kB\nSwapFree:          90000 kB\n"
+        ))
+        self.write_file(os.path.join(self.procpath, "vmstat"), "pswpin %d\npswpout %d\n" % (
+            self.advance_counter("pswpin", 4, seconds), self.advance_counter("pswpout", 8, seconds)
+        ))
+        disklines = []
+        for indx, diskname in enumerate(self.disks):
+            disklines.append("%4d %7d %s %d %d %d %d %d %d %d %d 0 %d %d\n" % (
+                179 if diskname.startswith("mmcblk") else 8, indx * 16, diskname,
+                self.advance_counter((diskname, "reads"), 40, seconds), 0,
+                self.advance_counter((diskname, "rsect"), 2048, seconds),
+                self.advance_counter((diskname, "rtime"), 20, seconds),
+                self.advance_counter((diskname, "writes"), 25, seconds), 0,
+                self.advance_counter((diskname, "wsect"), 1024, seconds),
+                self.advance_counter((diskname, "wtime"), 30, seconds),
+                self.advance_counter((diskname, "busy"), 50, seconds),
+                self.advance_counter((diskname, "weighted"), 60, seconds),
+            ))
+        self.write_file(os.path.join(self.procpath, "diskstats"), "".join(disklines))
+        niclines = ["Inter-|   Receive                                                |  Transmit\n",
+                    " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop "
+                    "fifo colls carrier compressed\n"]
+        for nicname in self.nics:
+            niclines.append("%6s: %d %d 0 0 0 0 0 0 %d %d 0 0 0 0 0 0\n" % (
+                nicname, self.advance_counter((nicname, "rbytes"), 120000, seconds),
+                self.advance_counter((nicname, "rpackets"), 200, seconds),
+                self.advance_counter((nicname, "tbytes"), 40000, seconds),
+                self.advance_counter((nicname, "tpackets"), 120, seconds),
+            ))
+        self.write_file(os.path.join(self.procpath, "net", "dev") if os.path.isdir(
+            os.path.join(self.procpath, "net")) else self.make_net_dir(), "".join(niclines))
+
+    def make_net_dir(self):
+        os.makedirs(os.path.join(self.procpath, "net"))
+        return os.path.join(self.procpath, "net", "dev")
+
+    def advance(self, seconds=1.0, busyshr=0.1):
+        # Counters move between samples so rates and per-process CPU figures are not all zero
+        self.write_globals(seconds)
+        if self.cgroups:
+            self.write_cgroup_counters(seconds)
+        for prociden in self.random.sample(sorted(self.processes), max(int(self.procs * busyshr), 1)):
+            self.processes[prociden]["utime"] += int(seconds * self.clockhtz * self.random.uniform(0.01, 0.5))
+            self.write_process(prociden)
+
+    @contextlib.contextmanager
+    def installed(self):
+        # Real psutil parses the synthetic tree, so both process backends are measured on their actual code paths
+        prevpath = psutil.PROCFS_PATH
+        psutil.PROCFS_PATH = self.procpath
+        try:
+            yield self
+        finally:
+            psutil.PROCFS_PATH = prevpath
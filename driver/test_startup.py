@@ -0,0 +1,46 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench import benchfunc
+from click.testing import CliRunner
+
+# Generous bounds for a loaded test machine, a Raspberry Pi is expected to stay well under them
+IMPORT_MAXMS = float(os.environ.get("PIMONITOR_IMPORT_MAXMS", 5000))
+STARTUP_MAXMS = float(os.environ.get("PIMONITOR_STARTUP_MAXMS", 10000))
+
+
+def test_serving_modules_import_within_bound():
+    drivdire = os.path.dirname(os.path.abspath(__file__))
+    strttime = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import falc"], cwd=drivdire, check=True)
+    assert (time.perf_counter() - strttime) * 1000 < IMPORT_MAXMS
+
+
+def test_first_valid_livesync_within_bound():
+    result = CliRunner().invoke(benchfunc, ["startup", "-n", "1", "-x", str(STARTUP_MAXMS)])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["startup"]["first_valid_max_ms"] < STARTUP_MAXMS
@@ -0,0 +1,65 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import falcon
+import falcon.asgi
+import falcon.testing
+from falc import ExecutorResource, StaticFileHandler
+
+STREAM_SIZE = 64 * 1024
+
+
+def build_static_dir(tmp_path):
+    os.makedirs(tmp_path / "assets")
+    (tmp_path / "index.html").write_text("<html></html>")
+    body = os.urandom(STREAM_SIZE * 3 + 123)
+    (tmp_path / "assets" / "large.bin").write_bytes(body)
+    return body
+
+
+def test_large_file_streams_under_wsgi(tmp_path):
+    body = build_static_dir(tmp_path)
+    static = StaticFileHandler(str(tmp_path), stream_size=STREAM_SIZE)
+    app = falcon.App()
+    app.add_route("/assets/{filepath}", static)
+    resp = falcon.testing.TestClient(app).simulate_get("/assets/large.bin")
+    assert resp.status_code == 200
+    assert resp.content == body
+
+
+def test_large_file_streams_under_asgi(tmp_path):
+    body = build_static_dir(tmp_path)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        static = StaticFileHandler(str(tmp_path), stream_size=STREAM_SIZE, executor=executor, chunk_size=4096)
+        app = falcon.asgi.App()
+        # Wrapped the way mainfunc serves every synchronous resource in the ASGI mode
+        app.add_route("/assets/{filepath}", ExecutorResource(static, executor))
+        client = falcon.testing.TestClient(app)
+        resp = client.simulate_get("/assets/large.bin")
+        assert resp.status_code == 200
+        assert resp.headers["Content-Length"] == str(len(body))
+        assert resp.content == body
+        etag = resp.headers["ETag"]
+        resp = client.simulate_get("/assets/large.bin", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
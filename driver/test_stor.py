@@ -0,0 +1,50 @@
+"""
+##########################################################################
+*
+*   Copyright © 2019-2020 Akashdeep Dhar <t0xic0der@fedoraproject.org>
+*
+*   This program is free software: you can redistribute it and/or modify
+*   it under the terms of the GNU General Public License as published by
+*   the Free Software Foundation, either version 3 of the License, or
+*   (at your option) any later version.
+*
+*   This program is distributed in the hope that it will be useful,
+*   but WITHOUT ANY WARRANTY; without even the implied warranty of
+*   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+*   GNU General Public License for more details.
+*
+*   You should have received a copy of the GNU General Public License
+*   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*
+##########################################################################
+"""
+
+import os
+
+from stor import MAXIMUM_PAYLOAD, DiskHistoryStore
+
+
+def test_sample_wider_than_one_frame_reads_back(tmp_path):
+    diskstor = DiskHistoryStore(str(tmp_path), maxseries=20000)
+    metrlist = ["metric.%d" % indx for indx in range(20000)]
+    diskstor.record(1000.0, {indx: 1e9 + jndx for jndx, indx in enumerate(metrlist)})
+    diskstor.record(1001.0, {indx: 2.0 for indx in metrlist})
+    diskstor.close()
+    # Large deltas across that many series cannot fit one record frame
+    assert os.path.getsize(diskstor.segpath) > MAXIMUM_PAYLOAD
+    retndata = diskstor.query(metrlist, 1000.0, 1001.0, step=1)
+    for jndx, indx in enumerate(metrlist):
+        assert retndata["series"][indx] == [[1000, 1e9 + jndx], [1001, 2.0]]
+
+
+def test_identifiers_of_retired_series_are_reused(tmp_path):
+    diskstor = DiskHistoryStore(str(tmp_path), maxbytes=1, segbytes=1, maxseries=2)
+    diskstor.record(1000.0, {"old.a": 1.0, "old.b": 2.0})
+    diskstor.record(1001.0, {})
+    diskstor.record(1002.0, {"new.a": 3.0})
+    diskstor.close()
+    # The first segment was retired, so one of its identifiers serves the new series
+    assert diskstor.metrics["new.a"] in (0, 1)
+    with open(os.path.join(str(tmp_path), "metrics.idx"), encoding="utf-8") as fileobjc:
+        assert "new.a" in fileobjc.read().splitlines()
+    assert diskstor.query(["new.a"], 1002.0, 1002.0, step=1)["series"]["new.a"] == [[1002, 3.0]]
@@ -1,12 +1,29 @@
 import { useState, useEffect, useRef } from 'react';
 import { useApi } from './useApi';
 import { useAuth } from '../context/AuthContext';
-import type { LiveSyncResponse } from '../types/api';
+import type { LiveSyncResponse, LiveSyncDeltaFrame, LiveSyncFrame } from '../types/api';
 
 const POLL_INTERVAL = 1000;
 
+type SectionMap = Record<string, Record<string, unknown>>;
+
+function applyDelta(prev: LiveSyncResponse, frame: LiveSyncDeltaFrame): LiveSyncResponse {
+  const next: SectionMap = { ...(prev as unknown as SectionMap) };
+  for (const kind of ['added', 'changed'] as const) {
+    Object.entries(frame[kind]).forEach(([section, values]) => {
+      next[section] = { ...next[section], ...values };
+    });
+  }
+  Object.entries(frame.removed).forEach(([section, keys]) => {
+    const copy = { ...next[section] };
+    keys.forEach((key) => delete copy[key]);
+    next[section] = copy;
+  });
+  return next as unknown as LiveSyncResponse;
+}
+
 export function useLiveData() {
-  const { isConnected } = useAuth();
+  const { apiUrl, passcode, isConnected } = useAuth();
   const { fetchApi } = useApi();
   const [data, setData] = useState<LiveSyncResponse | null>(null);
   const [error, setError] = useState<Error | null>(null);
@@ -21,6 +38,7 @@ export function useLiveData() {
     }
 
     let cancelled = false;
+    let source: EventSource | null = null;
 
     async function poll() {
       try {
@@ -41,10 +59,48 @@ export function useLiveData() {
       }
     }
 
-    poll();
+    function stream() {
+      const url = new URL('/livestrm', apiUrl);
+      url.searchParams.set('passcode', passcode);
+      url.searchParams.set('rate', (POLL_INTERVAL / 1000).toString());
+      let received = false;
+      source = new EventSource(url.toString());
+
+      source.onmessage = (event) => {
+        const frame = JSON.parse(event.data) as LiveSyncFrame;
+        received = true;
+        setData((prev) => {
+          if (frame.fullsync) return frame.jsonobjc;
+          return prev ? applyDelta(prev, frame) : prev;
+        });
+        setError(null);
+        setConnectionLost(false);
+      };
+
+      source.onerror = () => {
+        if (cancelled) return;
+        if (!received) {
+          // Older drivers have no stream endpoint, fall back to polling
+          source?.close();
+          source = null;
+          poll();
+          return;
+        }
+        // EventSource reconnects on its own and resumes from the last event id
+        setError(new Error('Connection lost'));
+        setConnectionLost(true);
+      };
+    }
+
+    if (typeof EventSource !== 'undefined') {
+      stream();
+    } else {
+      poll();
+    }
 
     return () => {
       cancelled = true;
+      source?.close();
       if (timeoutRef.current) {
         clearTimeout(timeoutRef.current);
       }
@@ -24,6 +24,10 @@ export interface CpuStats {
   interrupts: number;
   soft_interrupts: number;
   syscalls: number;
+  ctx_switches_rate: number;
+  interrupts_rate: number;
+  soft_interrupts_rate: number;
+  syscalls_rate: number;
 }
 
 export interface VirtualMemory {
@@ -46,6 +50,41 @@ export interface SwapInfo {
   percent: number;
   sin: number;
   sout: number;
+  sin_rate: number;
+  sout_rate: number;
+}
+
+export interface DiskSpace {
+  total: number;
+  used: number;
+  free: number;
+  percent: number;
+}
+
+export interface CgroupUsage {
+  cpu_usage_usec: number;
+  cpu_user_usec: number;
+  cpu_system_usec: number;
+  nr_throttled: number;
+  throttled_usec: number;
+  memory_anon: number;
+  memory_file: number;
+  memory_kernel: number;
+  memory_shmem: number;
+  pgmajfault: number;
+  io_rbytes: number;
+  io_wbytes: number;
+  io_rios: number;
+  io_wios: number;
+  memory_current: number | null;
+  memory_max: number | null;
+  pids_current: number | null;
+  nr_procs: number;
+  cpu_percent: number;
+  throttled_percent: number;
+  read_bytes_rate: number;
+  write_bytes_rate: number;
+  pgmajfault_rate: number;
 }
 
 export interface DiskIO {
@@ -58,6 +97,11 @@ export interface DiskIO {
   read_merged_count: number;
   write_merged_count: number;
   busy_time: number;
+  read_bytes_rate: number;
+  write_bytes_rate: number;
+  read_iops: number;
+  write_iops: number;
+  busy_percent: number;
 }
 
 export interface DiskPartition {
@@ -76,6 +120,10 @@ export interface NetworkIO {
   errout: number;
   dropin: number;
   dropout: number;
+  bytes_sent_rate: number;
+  bytes_recv_rate: number;
+  packets_sent_rate: number;
+  packets_recv_rate: number;
 }
 
 export interface NetworkStats {
@@ -98,6 +146,8 @@ export interface ProcessInfo {
   username: string;
   memory_percent: number;
   cpu_percent: number;
+  ppid?: number;
+  rss?: number;
 }
 
 export interface ProcessDetail extends ProcessInfo {
@@ -129,8 +179,8 @@ export interface ProcessDetail extends ProcessInfo {
 export interface TempReading {
   label: string;
   current: number;
-  high: number;
-  critical: number;
+  high: number | null;
+  critical: number | null;
 }
 
 export interface FanReading {
@@ -144,10 +194,20 @@ export interface BatteryStatus {
   power_plugged: boolean;
 }
 
+// Per-source read state, values are served from the last good read while a source is stale
+export interface SensorSourceStatus {
+  updated: number | null;
+  stale: boolean;
+  failures: number;
+  error: string | null;
+  duration_ms: number | null;
+}
+
 export interface SensorData {
   senstemp: Record<string, TempReading[]>;
   fanspeed: Record<string, FanReading[]>;
   battstat: BatteryStatus | null;
+  sensstat?: Record<string, SensorSourceStatus>;
 }
 
 export interface SystemInfo {
@@ -157,7 +217,7 @@ export interface SystemInfo {
   Username: string;
 }
 
-// Live sync response (polled every second)
+// Live sync response (polled every second), cgrpinfo only when named in fields
 export interface LiveSyncResponse {
   virtdata: VirtualMemory;
   swapinfo: SwapInfo;
@@ -166,11 +226,33 @@ export interface LiveSyncResponse {
   cpuprcnt: Record<number, number>;
   cpuclock: Record<number, CpuClock>;
   diousage: Record<string, DiskIO>;
+  diskused: Record<string, DiskSpace>;
   netusage: Record<string, NetworkIO>;
   procinfo: Record<string, ProcessInfo>;
+  cgrpinfo?: Record<string, CgroupUsage>;
   sensread: SensorData;
 }
 
+// Live stream frames: a full snapshot, or a delta against the previous frame
+export interface LiveSyncFullFrame {
+  epoch: string;
+  seqnumbr: number;
+  fullsync: true;
+  jsonobjc: LiveSyncResponse;
+}
+
+export interface LiveSyncDeltaFrame {
+  epoch: string;
+  seqnumbr: number;
+  basenmbr: number;
+  fullsync: false;
+  added: Record<string, Record<string, unknown>>;
+  changed: Record<string, Record<string, unknown>>;
+  removed: Record<string, string[]>;
+}
+
+export type LiveSyncFrame = LiveSyncFullFrame | LiveSyncDeltaFrame;
+
 // Dead sync response (fetched once)
 export interface DeadSyncResponse {
   osnmdata: SystemInfo;
@@ -185,6 +267,13 @@ export interface DeadSyncResponse {
   sensread: SensorData;
 }
 
+// Cgroup listing response, keyed by path relative to the cgroup2 mount
+export interface CgroupListResponse {
+  available: boolean;
+  rootpath: string | null;
+  cgrpinfo: Record<string, CgroupUsage>;
+}
+
 // API error response
 export interface ApiError {
   retnmesg: 'deny';